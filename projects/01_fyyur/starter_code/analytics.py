@@ -0,0 +1,134 @@
+#----------------------------------------------------------------------------#
+# Booking analytics rollups.
+#
+# Show counts per venue, city and artist genre per month live in the
+# BookingRollup table. Each new Show adds to its rollup rows in the same
+# transaction that inserts it, so the counts are always exact and the
+# /admin/analytics dashboard reads only BookingRollup. The whole table can
+# be recomputed from scratch with:
+#
+#   flask rebuild-booking-rollups
+#----------------------------------------------------------------------------#
+
+import time
+from datetime import date
+
+import click
+import pandas as pd
+from flask.cli import with_appcontext
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from models import db, Venue, Show, BookingRollup
+
+# One statement per new show: fans the show out to its venue, city and each
+# of its artist's genres and adds 1 to those rows.
+INCREMENT_ROLLUPS = text('''
+  INSERT INTO "BookingRollup" (dimension, key, month, show_count)
+  SELECT dimension, key, CAST(date_trunc('month', CAST(:start_time AS timestamp)) AS date), count(*)
+  FROM (
+    SELECT 'venue' AS dimension, CAST("Venue".id AS text) AS key FROM "Venue" WHERE "Venue".id = :venue_id
+    UNION ALL
+    SELECT 'city', "Venue".city || ', ' || "Venue".state FROM "Venue" WHERE "Venue".id = :venue_id
+    UNION ALL
+    SELECT DISTINCT 'genre', unnest("Artist".genres) FROM "Artist" WHERE "Artist".id = :artist_id
+  ) AS keys
+  GROUP BY dimension, key
+  ON CONFLICT (dimension, key, month)
+  DO UPDATE SET show_count = "BookingRollup".show_count + EXCLUDED.show_count
+''')
+
+SHOWS_FOR_REBUILD = '''
+  SELECT "Show".id, "Show".start_time, "Show".venue_id, "Venue".city, "Venue".state, "Artist".genres
+  FROM "Show"
+  JOIN "Venue" ON "Venue".id = "Show".venue_id
+  JOIN "Artist" ON "Artist".id = "Show".artist_id
+'''
+
+
+@event.listens_for(Session, 'after_flush')
+def increment_booking_rollups(session, flush_context):
+  shows = [obj for obj in session.new if isinstance(obj, Show)]
+  if shows:
+    session.connection().execute(INCREMENT_ROLLUPS, [
+      {'start_time': show.start_time, 'venue_id': show.venue_id, 'artist_id': show.artist_id}
+      for show in shows
+    ])
+
+
+def compute_rollups(shows):
+  # shows: DataFrame with id, start_time, venue_id, city, state and genres
+  # (a list per row). Returns a DataFrame shaped like BookingRollup.
+  if shows.empty:
+    return pd.DataFrame(columns=['dimension', 'key', 'month', 'show_count'])
+
+  shows = shows.assign(month=shows['start_time'].dt.to_period('M').dt.to_timestamp().dt.date)
+
+  by_venue = shows.groupby(['venue_id', 'month']).size().reset_index(name='show_count')
+  by_venue = by_venue.assign(dimension='venue', key=by_venue['venue_id'].astype(str))
+
+  shows = shows.assign(place=shows['city'] + ', ' + shows['state'])
+  by_city = shows.groupby(['place', 'month']).size().reset_index(name='show_count')
+  by_city = by_city.assign(dimension='city', key=by_city['place'])
+
+  genres = shows[['id', 'genres', 'month']].explode('genres').dropna().drop_duplicates(['id', 'genres'])
+  by_genre = genres.groupby(['genres', 'month']).size().reset_index(name='show_count')
+  by_genre = by_genre.assign(dimension='genre', key=by_genre['genres'])
+
+  columns = ['dimension', 'key', 'month', 'show_count']
+  return pd.concat([by_venue[columns], by_city[columns], by_genre[columns]], ignore_index=True)
+
+
+def rebuild_rollups(connection):
+  # Recomputes every rollup row from Show in one pass and swaps the table
+  # contents in a single transaction. Returns (shows read, rows written).
+  connection.execute(text('LOCK TABLE "BookingRollup" IN EXCLUSIVE MODE'))
+  shows = pd.read_sql(SHOWS_FOR_REBUILD, connection, parse_dates=['start_time'])
+  rollups = compute_rollups(shows)
+
+  connection.execute(BookingRollup.__table__.delete())
+  if not rollups.empty:
+    rollups['show_count'] = rollups['show_count'].astype(int)
+    connection.execute(BookingRollup.__table__.insert(), rollups.to_dict('records'))
+  return len(shows), len(rollups)
+
+
+def summarize(months=12, limit=10, today=None):
+  # Totals per venue, city and genre over the last `months` months plus a
+  # per-month series, all read from BookingRollup.
+  today = today or date.today()
+  index = today.year * 12 + today.month - 1 - (months - 1)
+  since = date(index // 12, index % 12 + 1, 1)
+
+  totals = db.session.query(BookingRollup.dimension, BookingRollup.key, db.func.sum(BookingRollup.show_count)) \
+    .filter(BookingRollup.month >= since) \
+    .group_by(BookingRollup.dimension, BookingRollup.key) \
+    .order_by(db.func.sum(BookingRollup.show_count).desc()).all()
+
+  summary = {'since': since, 'venue': [], 'city': [], 'genre': [], 'months': []}
+  for dimension, key, count in totals:
+    if len(summary[dimension]) < limit:
+      summary[dimension].append({'key': key, 'label': key, 'show_count': int(count)})
+
+  venue_ids = [int(row['key']) for row in summary['venue']]
+  names = dict(db.session.query(Venue.id, Venue.name).filter(Venue.id.in_(venue_ids)).all())
+  for row in summary['venue']:
+    row['label'] = names.get(int(row['key']), 'Venue ' + row['key'])
+
+  # Every show has exactly one venue row, so those rows sum to the monthly totals.
+  per_month = db.session.query(BookingRollup.month, db.func.sum(BookingRollup.show_count)) \
+    .filter(BookingRollup.dimension == 'venue', BookingRollup.month >= since) \
+    .group_by(BookingRollup.month).order_by(BookingRollup.month).all()
+  summary['months'] = [{'month': month, 'show_count': int(count)} for month, count in per_month]
+
+  return summary
+
+
+@click.command('rebuild-booking-rollups')
+@with_appcontext
+def rebuild_booking_rollups():
+  """Recompute the booking analytics rollups from the Show table."""
+  start = time.perf_counter()
+  with db.engine.begin() as connection:
+    shows, rows = rebuild_rollups(connection)
+  click.echo('Rolled up {} show(s) into {} row(s) in {:.2f}s'.format(shows, rows, time.perf_counter() - start))
@@ -0,0 +1,87 @@
+#----------------------------------------------------------------------------#
+# Top-k recommendation latency at 100k artists.
+#
+#   python benchmarks/bench_recommendations.py --artists 100000 --venues 10000
+#
+# Fills the recommender with synthetic artists and venues (no database) and
+# compares the vectorized scoring in recommendations.py with scoring each
+# pair in a Python loop.
+#----------------------------------------------------------------------------#
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from recommendations import Recommender, GENRE_WEIGHT, CITY_WEIGHT, STATE_WEIGHT
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+  'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+  'Rock n Roll', 'Soul', 'Other']
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'FL', 'MA', 'OR', 'CO', 'GA']
+
+
+def fake_row(rng):
+  state = rng.choice(STATES)
+  city = '{} City {}'.format(state, rng.randrange(20))
+  return city, state, rng.sample(GENRES, rng.randint(1, 4)), rng.random() < 0.5
+
+
+def python_top_k(venue, artists, limit):
+  city, state, genres, _ = venue
+  genres = set(genres)
+  scored = []
+  for artist_id, (artist_city, artist_state, artist_genres, seeking) in artists.items():
+    if not seeking:
+      continue
+    artist_genres = set(artist_genres)
+    union = len(genres | artist_genres)
+    score = GENRE_WEIGHT * (len(genres & artist_genres) / union if union else 0)
+    score += CITY_WEIGHT * (artist_city.lower() == city.lower() and artist_state.lower() == state.lower())
+    score += STATE_WEIGHT * (artist_state.lower() == state.lower())
+    scored.append((score, artist_id))
+  return heapq.nlargest(limit, scored)
+
+
+def timed(fn, repeat):
+  start = time.perf_counter()
+  for _ in range(repeat):
+    fn()
+  return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--artists', type=int, default=100000)
+  parser.add_argument('--venues', type=int, default=10000)
+  parser.add_argument('--limit', type=int, default=10)
+  parser.add_argument('--repeat', type=int, default=50)
+  args = parser.parse_args()
+
+  rng = random.Random(42)
+  artists = {artist_id: fake_row(rng) for artist_id in range(1, args.artists + 1)}
+  venues = {venue_id: fake_row(rng) for venue_id in range(1, args.venues + 1)}
+
+  recommender = Recommender()
+  start = time.perf_counter()
+  for artist_id, row in artists.items():
+    recommender.upsert_artist(artist_id, *row)
+  for venue_id, row in venues.items():
+    recommender.upsert_venue(venue_id, *row)
+  recommender.loaded_at = time.time()
+  print('build {} artists + {} venues: {:.0f} ms'.format(
+    args.artists, args.venues, (time.perf_counter() - start) * 1000))
+
+  venue_ids = [rng.randrange(1, args.venues + 1) for _ in range(args.repeat)]
+  queries = iter(venue_ids * 2)
+  vectorized = timed(lambda: recommender.artists_for_venue(next(queries), limit=args.limit), args.repeat)
+  queries = iter(venue_ids)
+  loop = timed(lambda: python_top_k(venues[next(queries)], artists, args.limit), min(args.repeat, 5))
+
+  print('top-{} artists for a venue, vectorized: {:8.2f} ms'.format(args.limit, vectorized))
+  print('top-{} artists for a venue, python loop: {:8.2f} ms'.format(args.limit, loop))
+  print('speedup: {:.0f}x'.format(loop / vectorized))
@@ -0,0 +1,114 @@
+#----------------------------------------------------------------------------#
+# Requests/sec of the Flask development server vs. gunicorn (wsgi.py).
+#
+# Run from the starter_code folder with the database configured as for app.py:
+#
+#   python benchmarks/bench_wsgi.py --path /venues --seconds 10 --clients 32
+#
+# Both servers are started as subprocesses with the same production config,
+# then hammered by the same pool of keep-alive HTTP clients.
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEV_SERVER = [
+  sys.executable, '-c',
+  "import sys; from app import create_app; "
+  "create_app('config.ProductionConfig').run(port=int(sys.argv[1]), threaded=True)"
+]
+GUNICORN = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app', '--bind']
+
+
+def wait_until_up(port, timeout=15):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    try:
+      conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+      conn.request('GET', '/')
+      conn.getresponse().read()
+      return
+    except OSError:
+      time.sleep(0.2)
+  raise RuntimeError('server on port {} did not start'.format(port))
+
+
+def hammer(port, path, seconds, clients):
+  latencies = []
+  errors = [0]
+  lock = threading.Lock()
+  stop_at = time.time() + seconds
+
+  def client():
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    local = []
+    while time.time() < stop_at:
+      start = time.perf_counter()
+      try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        if response.status >= 500:
+          errors[0] += 1
+      except OSError:
+        errors[0] += 1
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        continue
+      local.append(time.perf_counter() - start)
+    with lock:
+      latencies.extend(local)
+
+  threads = [threading.Thread(target=client) for _ in range(clients)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  latencies.sort()
+  count = len(latencies)
+  return {
+    'requests': count,
+    'errors': errors[0],
+    'rps': count / seconds,
+    'p50_ms': latencies[count // 2] * 1000 if count else 0,
+    'p99_ms': latencies[int(count * 0.99)] * 1000 if count else 0
+  }
+
+
+def run(name, command, port, args):
+  env = dict(os.environ, WEB_CONCURRENCY=str(args.workers))
+  server = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  try:
+    wait_until_up(port)
+    hammer(port, args.path, 1, args.clients)  # warm up
+    result = hammer(port, args.path, args.seconds, args.clients)
+  finally:
+    server.terminate()
+    server.wait()
+
+  print('{:<12} {:>9.1f} req/s  p50 {:>7.2f} ms  p99 {:>7.2f} ms  ({} requests, {} errors)'.format(
+    name, result['rps'], result['p50_ms'], result['p99_ms'], result['requests'], result['errors']))
+  return result
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--path', default='/')
+  parser.add_argument('--seconds', type=float, default=10)
+  parser.add_argument('--clients', type=int, default=32)
+  parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1)
+  args = parser.parse_args()
+
+  print('GET {} for {}s with {} clients'.format(args.path, args.seconds, args.clients))
+  dev = run('dev server', DEV_SERVER + ['5051'], 5051, args)
+  prod = run('gunicorn', GUNICORN + ['127.0.0.1:5052'], 5052, args)
+  if dev['rps']:
+    print('gunicorn speedup: {:.1f}x'.format(prod['rps'] / dev['rps']))
@@ -15,3 +15,25 @@ DEBUG = True
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 SQLALCHEMY_DATABASE_URI = database_path
+
+# Snapshot of the in-memory search index, shared by all processes (see search_index.py).
+SEARCH_INDEX_SNAPSHOT = os.path.join(basedir, 'search_index.pickle')
+
+
+# Production settings, used by wsgi.py when serving with gunicorn.
+class ProductionConfig:
+    # Every worker must sign sessions with the same key, so take it from the
+    # environment instead of generating a new one per process.
+    SECRET_KEY = os.environ.get('SECRET_KEY', SECRET_KEY)
+    DEBUG = False
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', database_path)
+    SEARCH_INDEX_SNAPSHOT = os.environ.get('SEARCH_INDEX_SNAPSHOT', SEARCH_INDEX_SNAPSHOT)
+    # Each worker process gets its own pool, so keep it small: total
+    # connections are roughly workers * (pool_size + max_overflow).
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800
+    }
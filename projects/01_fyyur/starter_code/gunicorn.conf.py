@@ -0,0 +1,29 @@
+#----------------------------------------------------------------------------#
+# Gunicorn settings for Fyyur.
+#----------------------------------------------------------------------------#
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'sync'
+timeout = 30
+keepalive = 2
+
+# Load the app in the master before forking so workers share its memory.
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+  # The master must never hand an open database connection to its children:
+  # two processes sharing one socket corrupt each other's sessions. Dropping
+  # the pool here means each worker opens its own connections on first use.
+  from wsgi import app
+  from models import db
+
+  with app.app_context():
+    db.engine.dispose()
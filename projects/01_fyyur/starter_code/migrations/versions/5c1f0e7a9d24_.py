@@ -0,0 +1,88 @@
+"""partition Show by month on start_time
+
+Revision ID: 5c1f0e7a9d24
+Revises: a63be0a40462
+Create Date: 2026-10-19 10:12:44.318205
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0e7a9d24'
+down_revision = 'a63be0a40462'
+branch_labels = None
+depends_on = None
+
+# Monthly partitions created past the current month. After this,
+# `flask maintain-show-partitions` keeps the window moving.
+MONTHS_AHEAD = 12
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    # A partitioned table can't be created from an existing one, so build a
+    # new "Show" alongside the old heap and copy the rows across.
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_legacy"')
+    op.execute('ALTER TABLE "Show_legacy" RENAME CONSTRAINT "Show_pkey" TO "Show_legacy_pkey"')
+
+    # The primary key of a partitioned table must include the partition key.
+    op.execute('''
+        CREATE TABLE "Show" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            start_time timestamp without time zone NOT NULL,
+            artist_id integer NOT NULL REFERENCES "Artist" (id),
+            venue_id integer NOT NULL REFERENCES "Venue" (id),
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    first, = connection.execute(sa.text('SELECT min(start_time) FROM "Show_legacy"')).fetchone()
+    month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if first is not None and first < month:
+        month = datetime(first.year, first.month, 1)
+    last = add_months(datetime.now().replace(day=1), MONTHS_AHEAD)
+
+    while month <= last:
+        op.execute(
+            'CREATE TABLE "Show_y{0:%Y}m{0:%m}" PARTITION OF "Show" '
+            'FOR VALUES FROM (\'{0:%Y-%m-%d}\') TO (\'{1:%Y-%m-%d}\')'.format(month, add_months(month, 1)))
+        month = add_months(month, 1)
+
+    op.execute('INSERT INTO "Show" (id, start_time, artist_id, venue_id) '
+               'SELECT id, start_time, artist_id, venue_id FROM "Show_legacy"')
+    op.execute('DROP TABLE "Show_legacy"')
+
+    # Indexes on the parent are created on every partition, present and future.
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+
+
+def downgrade():
+    # Partitions already moved to the show_archive schema are left there.
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_partitioned"')
+    op.execute('ALTER TABLE "Show_partitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_partitioned_pkey"')
+    op.create_table('Show',
+    sa.Column('id', sa.Integer(), server_default=sa.text('nextval(\'"Show_id_seq"\'::regclass)'), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('INSERT INTO "Show" (id, start_time, artist_id, venue_id) '
+               'SELECT id, start_time, artist_id, venue_id FROM "Show_partitioned"')
+    op.execute('DROP TABLE "Show_partitioned" CASCADE')
@@ -39,10 +39,29 @@ class Artist(db.Model):
     genres = db.Column(db.ARRAY(db.String),nullable=False)
     show = db.relationship('Show', backref='artist', lazy="joined")
 
+# Show is range partitioned by month on start_time, so start_time is part of
+# the primary key. Partitions are managed by partitions.py.
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        {'postgresql_partition_by': 'RANGE (start_time)'}
+    )
 
-    id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime,nullable=False)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    start_time = db.Column(db.DateTime, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
\ No newline at end of file
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+
+# Pre-aggregated show counts per month, maintained by analytics.py so the
+# analytics dashboard never has to GROUP BY the live Show table.
+# dimension is 'venue' (key = venue id), 'city' (key = "city, state") or
+# 'genre' (key = artist genre).
+class BookingRollup(db.Model):
+    __tablename__ = 'BookingRollup'
+
+    dimension = db.Column(db.String(16), primary_key=True)
+    key = db.Column(db.String(250), primary_key=True)
+    month = db.Column(db.Date, primary_key=True, index=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Show table partition maintenance.
+#
+# "Show" is range partitioned by month on start_time (see migration
+# 5c1f0e7a9d24). Upcoming-show queries filter on start_time > now(), so
+# PostgreSQL only has to visit the current and future monthly partitions.
+# This module pre-creates partitions ahead of time and moves old ones out of
+# the live table:
+#
+#   flask maintain-show-partitions --ahead 12 --retain 24
+#----------------------------------------------------------------------------#
+
+import re
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from models import db
+
+DEFAULT_PARTITION = 'Show_default'
+ARCHIVE_SCHEMA = 'show_archive'
+PARTITION_NAME = re.compile(r'^Show_y(\d{4})m(\d{2})$')
+
+
+def month_start(moment):
+  return datetime(moment.year, moment.month, 1)
+
+
+def add_months(month, months):
+  index = month.year * 12 + month.month - 1 + months
+  return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+  return 'Show_y{:04d}m{:02d}'.format(month.year, month.month)
+
+
+def list_partitions(connection):
+  # Returns {first day of month: partition name} for the monthly partitions
+  # currently attached to "Show".
+  rows = connection.execute(text(
+    'SELECT child.relname FROM pg_inherits '
+    'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+    'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+    'WHERE parent.relname = \'Show\''))
+
+  partitions = {}
+  for (name,) in rows:
+    match = PARTITION_NAME.match(name)
+    if match:
+      partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+  return partitions
+
+
+def create_partition(connection, month):
+  name = partition_name(month)
+  bounds = {'low': month, 'high': add_months(month, 1)}
+
+  # PostgreSQL refuses to attach a partition while the default partition
+  # holds rows in its range, so move any strays out first and back in after.
+  moved = connection.execute(text(
+    'DELETE FROM "{}" WHERE start_time >= :low AND start_time < :high '
+    'RETURNING id, start_time, artist_id, venue_id'.format(DEFAULT_PARTITION)), bounds).fetchall()
+
+  connection.execute(text(
+    'CREATE TABLE "{}" PARTITION OF "Show" '
+    'FOR VALUES FROM (\'{:%Y-%m-%d}\') TO (\'{:%Y-%m-%d}\')'.format(name, bounds['low'], bounds['high'])))
+
+  if moved:
+    connection.execute(text(
+      'INSERT INTO "Show" (id, start_time, artist_id, venue_id) '
+      'VALUES (:id, :start_time, :artist_id, :venue_id)'),
+      [dict(row._mapping) for row in moved])
+  return name
+
+
+def archive_partition(connection, month, drop=False):
+  # Detached partitions keep their rows but are no longer scanned by any
+  # query against "Show". They are parked in the show_archive schema unless
+  # drop is set.
+  name = partition_name(month)
+  connection.execute(text('ALTER TABLE "Show" DETACH PARTITION "{}"'.format(name)))
+  if drop:
+    connection.execute(text('DROP TABLE "{}"'.format(name)))
+  else:
+    connection.execute(text('CREATE SCHEMA IF NOT EXISTS {}'.format(ARCHIVE_SCHEMA)))
+    connection.execute(text('ALTER TABLE "{}" SET SCHEMA {}'.format(name, ARCHIVE_SCHEMA)))
+  return name
+
+
+def maintain_partitions(connection, months_ahead=12, months_retained=24, drop=False, now=None):
+  # Ensures a partition exists for every month from the current one to
+  # months_ahead months out, and archives partitions that ended more than
+  # months_retained months ago. Returns (created, archived) partition names.
+  current = month_start(now or datetime.now())
+  existing = list_partitions(connection)
+
+  created = []
+  for offset in range(months_ahead + 1):
+    month = add_months(current, offset)
+    if month not in existing:
+      created.append(create_partition(connection, month))
+
+  archived = []
+  if months_retained is not None:
+    cutoff = add_months(current, -months_retained)
+    for month in sorted(existing):
+      if month < cutoff:
+        archived.append(archive_partition(connection, month, drop=drop))
+
+  return created, archived
+
+
+@click.command('maintain-show-partitions')
+@click.option('--ahead', default=12, show_default=True, help='Months of future partitions to pre-create.')
+@click.option('--retain', default=24, show_default=True, help='Months of past partitions to keep attached.')
+@click.option('--drop', is_flag=True, help='Drop old partitions instead of moving them to the archive schema.')
+@with_appcontext
+def maintain_show_partitions(ahead, retain, drop):
+  """Pre-create future Show partitions and archive old ones."""
+  with db.engine.begin() as connection:
+    created, archived = maintain_partitions(connection, months_ahead=ahead, months_retained=retain, drop=drop)
+
+  click.echo('Created {} partition(s): {}'.format(len(created), ', '.join(created) or '-'))
+  click.echo('{} {} partition(s): {}'.format('Dropped' if drop else 'Archived', len(archived), ', '.join(archived) or '-'))
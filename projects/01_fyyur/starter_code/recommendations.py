@@ -0,0 +1,278 @@
+#----------------------------------------------------------------------------#
+# Artist/venue matchmaking.
+#
+# Every artist and venue is a row in a NumPy feature matrix: a genre
+# membership vector plus encoded city and state. Recommending artists for a
+# venue (or venues for an artist) scores every candidate in one vectorized
+# pass and takes the top k with argpartition, so cost grows with the number
+# of rows, not with Python-level work per pair.
+#
+# The matrices are built once per process (wsgi.py builds them before
+# gunicorn forks) and kept current from committed edits via SQLAlchemy
+# session events. Edits made in another worker are picked up by the periodic
+# reload (REFRESH_SECONDS), which builds new matrices on a background thread
+# and swaps them in; requests keep using the current ones meanwhile.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Venue, Artist
+
+GENRE_WEIGHT = 0.6
+CITY_WEIGHT = 0.3
+STATE_WEIGHT = 0.1
+DEFAULT_LIMIT = 10
+REFRESH_SECONDS = 300
+
+
+class MatchIndex:
+  # Feature rows for one side of the match (artists or venues). Rows are
+  # appended as ids are seen and cleared, not compacted, on delete.
+
+  def __init__(self, capacity=1024, genre_width=32):
+    self.rows = {}
+    self.size = 0
+    self.ids = np.zeros(capacity, dtype=np.int64)
+    self.genres = np.zeros((capacity, genre_width), dtype=np.float32)
+    self.genre_counts = np.zeros(capacity, dtype=np.float32)
+    self.cities = np.full(capacity, -1, dtype=np.int32)
+    self.states = np.full(capacity, -1, dtype=np.int32)
+    self.available = np.zeros(capacity, dtype=bool)
+
+  def _grow(self, rows, genre_width):
+    capacity, width = self.genres.shape
+    new_capacity, new_width = capacity, width
+    while new_capacity < rows:
+      new_capacity *= 2
+    while new_width < genre_width:
+      new_width *= 2
+    if (new_capacity, new_width) == (capacity, width):
+      return
+
+    genres = np.zeros((new_capacity, new_width), dtype=np.float32)
+    genres[:capacity, :width] = self.genres
+    self.genres = genres
+    extra = new_capacity - capacity
+    self.ids = np.concatenate([self.ids, np.zeros(extra, dtype=np.int64)])
+    self.genre_counts = np.concatenate([self.genre_counts, np.zeros(extra, dtype=np.float32)])
+    self.cities = np.concatenate([self.cities, np.full(extra, -1, dtype=np.int32)])
+    self.states = np.concatenate([self.states, np.full(extra, -1, dtype=np.int32)])
+    self.available = np.concatenate([self.available, np.zeros(extra, dtype=bool)])
+
+  def upsert(self, entity_id, genre_columns, city, state, seeking):
+    row = self.rows.get(entity_id)
+    if row is None:
+      row = self.size
+      self._grow(row + 1, max(genre_columns, default=-1) + 1)
+      self.rows[entity_id] = row
+      self.ids[row] = entity_id
+      self.size += 1
+    else:
+      self._grow(0, max(genre_columns, default=-1) + 1)
+
+    self.genres[row] = 0
+    self.genres[row, genre_columns] = 1
+    self.genre_counts[row] = len(genre_columns)
+    self.cities[row] = city
+    self.states[row] = state
+    self.available[row] = bool(seeking)
+
+  def remove(self, entity_id):
+    row = self.rows.pop(entity_id, None)
+    if row is not None:
+      self.available[row] = False
+      self.ids[row] = 0
+
+  def features(self, entity_id):
+    row = self.rows.get(entity_id)
+    if row is None:
+      return None
+    return self.genres[row], self.genre_counts[row], self.cities[row], self.states[row]
+
+  def top_k(self, genres, genre_count, city, state, limit):
+    # Weighted sum of genre Jaccard similarity and location matches over every
+    # candidate row; unavailable rows are excluded before ranking.
+    n = self.size
+    width = min(len(genres), self.genres.shape[1])
+    intersection = self.genres[:n, :width] @ genres[:width]
+    union = self.genre_counts[:n] + genre_count - intersection
+    similarity = np.divide(intersection, union, out=np.zeros(n, dtype=np.float32), where=union > 0)
+
+    scores = GENRE_WEIGHT * similarity
+    scores += CITY_WEIGHT * (self.cities[:n] == city)
+    scores += STATE_WEIGHT * (self.states[:n] == state)
+    scores[~self.available[:n]] = -np.inf
+
+    limit = min(limit, n)
+    if limit <= 0:
+      return []
+    best = np.argpartition(-scores, limit - 1)[:limit]
+    best = best[np.argsort(-scores[best], kind='stable')]
+    return [(int(self.ids[row]), float(scores[row])) for row in best if scores[row] > -np.inf]
+
+
+class Recommender:
+
+  def __init__(self):
+    self.lock = threading.RLock()
+    self.loaded_at = None
+    # Changes committed while a load reads the tables, one list per load in
+    # progress, replayed onto the new matrices before they are swapped in.
+    self.journals = []
+    self.refreshing = False
+    self.reset()
+
+  def reset(self):
+    self.genre_columns = {}
+    self.places = {}
+    self.artists = MatchIndex()
+    self.venues = MatchIndex()
+
+  def _genres(self, genres):
+    columns = []
+    for genre in genres or []:
+      columns.append(self.genre_columns.setdefault(genre, len(self.genre_columns)))
+    return columns
+
+  def _place(self, *parts):
+    key = tuple((part or '').strip().lower() for part in parts)
+    return self.places.setdefault(key, len(self.places))
+
+  def _upsert(self, index, entity_id, city, state, genres, seeking):
+    index.upsert(entity_id, self._genres(genres), self._place(city, state), self._place(state), seeking)
+
+  def upsert_artist(self, artist_id, city, state, genres, seeking_venue):
+    with self.lock:
+      self._upsert(self.artists, artist_id, city, state, genres, seeking_venue)
+
+  def upsert_venue(self, venue_id, city, state, genres, seeking_talent):
+    with self.lock:
+      self._upsert(self.venues, venue_id, city, state, genres, seeking_talent)
+
+  def apply(self, changes):
+    # changes are ('artist' or 'venue', id, (city, state, genres, seeking)),
+    # with None instead of the values for a delete.
+    with self.lock:
+      for journal in self.journals:
+        journal.extend(changes)
+      if self.loaded_at is not None:
+        self._apply(changes)
+
+  def _apply(self, changes):
+    for kind, entity_id, values in changes:
+      index = self.artists if kind == 'artist' else self.venues
+      if values is None:
+        index.remove(entity_id)
+      else:
+        self._upsert(index, entity_id, *values)
+
+  def load(self):
+    journal = []
+    with self.lock:
+      self.journals.append(journal)
+
+    try:
+      # Column queries only: loading the models would also pull in every Show
+      # through the joined relationships.
+      artists = db.session.query(Artist.id, Artist.city, Artist.state, Artist.genres, Artist.seeking_venue).all()
+      venues = db.session.query(Venue.id, Venue.city, Venue.state, Venue.genres, Venue.seeking_talent).all()
+
+      # Built without the lock, so recommendations keep being served from
+      # the current matrices until the swap.
+      fresh = Recommender()
+      for row in artists:
+        fresh._upsert(fresh.artists, *row)
+      for row in venues:
+        fresh._upsert(fresh.venues, *row)
+
+      with self.lock:
+        self.genre_columns, self.places = fresh.genre_columns, fresh.places
+        self.artists, self.venues = fresh.artists, fresh.venues
+        self._apply(journal)
+        self.loaded_at = time.time()
+    finally:
+      with self.lock:
+        self.journals.remove(journal)
+
+  def ensure_loaded(self):
+    if self.loaded_at is None:
+      self.load()
+    elif time.time() - self.loaded_at > REFRESH_SECONDS:
+      self._refresh()
+
+  def _refresh(self):
+    # One background reload at a time; if it fails the next request past
+    # REFRESH_SECONDS starts another.
+    with self.lock:
+      if self.refreshing:
+        return
+      self.refreshing = True
+    app = current_app._get_current_object()
+
+    def run():
+      with app.app_context():
+        try:
+          self.load()
+        except Exception:
+          app.logger.exception('Could not reload the recommendation matrices')
+        finally:
+          self.refreshing = False
+          db.session.remove()
+
+    threading.Thread(target=run, name='recommender-refresh', daemon=True).start()
+
+  def _recommend(self, source, target, entity_id, limit):
+    self.ensure_loaded()
+    with self.lock:
+      features = source.features(entity_id)
+      if features is None:
+        return None
+      return target.top_k(*features, limit=limit)
+
+  def artists_for_venue(self, venue_id, limit=DEFAULT_LIMIT):
+    # Returns [(artist_id, score)] best first, or None for an unknown venue.
+    return self._recommend(self.venues, self.artists, venue_id, limit)
+
+  def venues_for_artist(self, artist_id, limit=DEFAULT_LIMIT):
+    # Returns [(venue_id, score)] best first, or None for an unknown artist.
+    return self._recommend(self.artists, self.venues, artist_id, limit)
+
+
+recommender = Recommender()
+
+#----------------------------------------------------------------------------#
+# Incremental refresh.
+#
+# Changes are captured at flush time, while the attribute values are still
+# loaded, and applied only once the transaction commits.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'after_flush')
+def collect_match_changes(session, flush_context):
+  pending = session.info.setdefault('match_changes', [])
+  for obj in list(session.new) + list(session.dirty):
+    if isinstance(obj, Artist):
+      pending.append(('artist', obj.id, (obj.city, obj.state, obj.genres, obj.seeking_venue)))
+    elif isinstance(obj, Venue):
+      pending.append(('venue', obj.id, (obj.city, obj.state, obj.genres, obj.seeking_talent)))
+  for obj in session.deleted:
+    if isinstance(obj, Artist):
+      pending.append(('artist', obj.id, None))
+    elif isinstance(obj, Venue):
+      pending.append(('venue', obj.id, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_match_changes(session):
+  recommender.apply(session.info.pop('match_changes', []))
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_match_changes(session):
+  session.info.pop('match_changes', None)
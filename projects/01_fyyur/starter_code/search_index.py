@@ -0,0 +1,330 @@
+#----------------------------------------------------------------------------#
+# Unified in-memory search over venues, artists and upcoming shows.
+#
+# An inverted index (term -> {document: term frequency}) ranked with BM25.
+# Every query term also matches indexed terms it is a prefix of, found by
+# bisecting the sorted vocabulary, so "mus" finds "Musical Hop".
+#
+# The index is loaded once per process, from a snapshot file when a recent
+# one exists and otherwise from the database (then written back as the new
+# snapshot). Committed inserts, edits and deletes are applied through
+# SQLAlchemy session events; edits made in other workers are picked up by
+# the periodic rebuild (REFRESH_SECONDS), which runs on a background thread
+# while the current index keeps serving. The committed changes applied here
+# are kept with their times, so a rebuilt or snapshot index has the ones
+# newer than itself replayed onto it before it is swapped in.
+#----------------------------------------------------------------------------#
+
+import bisect
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, noload
+
+from models import db, Venue, Artist, Show
+
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX_EXPANSIONS = 50
+REFRESH_SECONDS = 300
+SNAPSHOT_VERSION = 1
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+  return TOKEN.findall((text or '').lower())
+
+
+def venue_document(venue):
+  return ('venue', venue.id), {
+    'type': 'venue', 'id': venue.id, 'name': venue.name,
+    'detail': '{}, {}'.format(venue.city, venue.state)
+  }, [venue.name, venue.city, venue.state, venue.address, ' '.join(venue.genres or []), venue.seeking_description]
+
+
+def artist_document(artist):
+  return ('artist', artist.id), {
+    'type': 'artist', 'id': artist.id, 'name': artist.name,
+    'detail': '{}, {}'.format(artist.city, artist.state)
+  }, [artist.name, artist.city, artist.state, ' '.join(artist.genres or []), artist.seeking_description]
+
+
+def show_document(show):
+  return ('show', show.id), {
+    'type': 'show', 'id': show.id, 'name': '{} at {}'.format(show.artist.name, show.venue.name),
+    'detail': '{}, {}'.format(show.venue.city, show.venue.state),
+    'artist_id': show.artist_id, 'venue_id': show.venue_id, 'start_time': show.start_time
+  }, [show.artist.name, show.venue.name, show.venue.city, show.venue.state, ' '.join(show.artist.genres or [])]
+
+
+class SearchIndex:
+
+  def __init__(self):
+    self.lock = threading.RLock()
+    self.loaded_at = None
+    # [(time, action, document)] of the changes applied since loaded_at.
+    self.changes = []
+    self.refreshing = False
+    self.reset()
+
+  def reset(self):
+    self.postings = {}
+    self.terms = []
+    self.documents = {}
+    self.doc_terms = {}
+    self.doc_lengths = {}
+    self.total_length = 0
+
+  def _add(self, key, info, fields):
+    self._remove(key)
+    counts = Counter(token for field in fields for token in tokenize(field))
+    for term, frequency in counts.items():
+      postings = self.postings.get(term)
+      if postings is None:
+        postings = self.postings[term] = {}
+        # terms is None while build() fills a new index; it is sorted once at the end.
+        if self.terms is not None:
+          bisect.insort(self.terms, term)
+      postings[key] = frequency
+    self.documents[key] = info
+    self.doc_terms[key] = counts
+    self.doc_lengths[key] = sum(counts.values())
+    self.total_length += self.doc_lengths[key]
+
+  def _remove(self, key):
+    counts = self.doc_terms.pop(key, None)
+    if counts is None:
+      return
+    self.documents.pop(key, None)
+    self.total_length -= self.doc_lengths.pop(key)
+    for term in counts:
+      postings = self.postings[term]
+      postings.pop(key, None)
+      if not postings:
+        del self.postings[term]
+        if self.terms is not None:
+          del self.terms[bisect.bisect_left(self.terms, term)]
+
+  def add(self, key, info, fields):
+    self.apply([('add', (key, info, fields))])
+
+  def remove(self, key):
+    self.apply([('remove', key)])
+
+  def apply(self, changes):
+    # changes are ('add', (key, info, fields)) or ('remove', key).
+    with self.lock:
+      now = time.time()
+      self.changes.extend((now, action, document) for action, document in changes)
+      if self.loaded_at is not None:
+        self._apply(changes)
+
+  def _apply(self, changes):
+    for action, document in changes:
+      if action == 'add':
+        self._add(*document)
+      else:
+        self._remove(document)
+
+  def _expand(self, token):
+    # The token itself plus up to MAX_PREFIX_EXPANSIONS longer terms it prefixes.
+    matches = []
+    start = bisect.bisect_left(self.terms, token)
+    for term in self.terms[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+      if not term.startswith(token):
+        break
+      matches.append((term, 1.0 if term == token else PREFIX_WEIGHT))
+    return matches
+
+  def search(self, query, limit=20, types=None, now=None):
+    # Returns [(score, document info)] best first. Shows that have already
+    # started are skipped.
+    now = now or datetime.now()
+    with self.lock:
+      count = len(self.documents)
+      if not count:
+        return []
+      average_length = self.total_length / count
+
+      scores = {}
+      for token in set(tokenize(query)):
+        for term, weight in self._expand(token):
+          postings = self.postings[term]
+          idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+          for key, frequency in postings.items():
+            length = self.doc_lengths[key]
+            tf = frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average_length))
+            scores[key] = scores.get(key, 0) + weight * idf * tf
+
+      results = []
+      for key, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        info = self.documents[key]
+        if types and info['type'] not in types:
+          continue
+        if info['type'] == 'show' and info['start_time'] <= now:
+          continue
+        results.append((score, info))
+        if len(results) == limit:
+          break
+      return results
+
+  #  Loading
+  #  ----------------------------------------------------------------
+
+  def _swap(self, fresh):
+    # Replaces the index with fresh, unless the current one is newer, after
+    # replaying the changes committed here since fresh was read.
+    with self.lock:
+      if self.loaded_at is not None and fresh.loaded_at <= self.loaded_at:
+        return False
+      self.changes = [change for change in self.changes if change[0] >= fresh.loaded_at]
+      fresh._apply((action, document) for changed_at, action, document in self.changes)
+      self.postings, self.terms, self.documents = fresh.postings, fresh.terms, fresh.documents
+      self.doc_terms, self.doc_lengths, self.total_length = fresh.doc_terms, fresh.doc_lengths, fresh.total_length
+      self.loaded_at = fresh.loaded_at
+    return True
+
+  def build(self):
+    # Timed from before the queries, so every commit they may have missed is
+    # newer than the index and gets replayed.
+    started = time.time()
+    # The documents don't need the shows that Venue and Artist join-load by default.
+    venues = Venue.query.options(noload(Venue.show)).all()
+    artists = Artist.query.options(noload(Artist.show)).all()
+    shows = Show.query.options(joinedload(Show.artist).noload(Artist.show), joinedload(Show.venue).noload(Venue.show)) \
+      .filter(Show.start_time > datetime.now()).all()
+
+    # Filled without the lock, so searches keep using the current index.
+    fresh = SearchIndex()
+    fresh.terms = None
+    for document in map(venue_document, venues):
+      fresh._add(*document)
+    for document in map(artist_document, artists):
+      fresh._add(*document)
+    for document in map(show_document, shows):
+      fresh._add(*document)
+    fresh.terms = sorted(fresh.postings)
+    fresh.loaded_at = started
+    self._swap(fresh)
+
+  def save(self, path):
+    with self.lock:
+      state = (SNAPSHOT_VERSION, self.loaded_at, self.postings, self.documents, self.doc_terms, self.total_length)
+      data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    # Write then rename so other processes never read a partial snapshot.
+    temporary = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temporary, 'wb') as snapshot:
+      snapshot.write(data)
+    os.replace(temporary, path)
+
+  def load_snapshot(self, path, max_age=REFRESH_SECONDS):
+    # Returns False, leaving the index untouched, if there is no usable
+    # snapshot younger than max_age seconds and newer than the index.
+    try:
+      with open(path, 'rb') as snapshot:
+        version, built_at, postings, documents, doc_terms, total_length = pickle.load(snapshot)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+      return False
+    if version != SNAPSHOT_VERSION or time.time() - built_at > max_age:
+      return False
+
+    fresh = SearchIndex()
+    fresh.postings = postings
+    fresh.terms = sorted(postings)
+    fresh.documents = documents
+    fresh.doc_terms = doc_terms
+    fresh.doc_lengths = {key: sum(counts.values()) for key, counts in doc_terms.items()}
+    fresh.total_length = total_length
+    fresh.loaded_at = built_at
+    return self._swap(fresh)
+
+  def refresh(self, snapshot_path=None):
+    if snapshot_path and self.load_snapshot(snapshot_path):
+      return
+    self.build()
+    if snapshot_path:
+      self.save(snapshot_path)
+
+  def ensure_loaded(self, snapshot_path=None):
+    # Only the first load runs on the calling thread; past REFRESH_SECONDS
+    # the index is refreshed in the background, one refresh at a time.
+    if self.loaded_at is None:
+      self.refresh(snapshot_path)
+      return
+    if time.time() - self.loaded_at <= REFRESH_SECONDS:
+      return
+    with self.lock:
+      if self.refreshing:
+        return
+      self.refreshing = True
+    app = current_app._get_current_object()
+
+    def run():
+      with app.app_context():
+        try:
+          self.refresh(snapshot_path)
+        except Exception:
+          app.logger.exception('Could not refresh the search index')
+        finally:
+          self.refreshing = False
+          db.session.remove()
+
+    threading.Thread(target=run, name='search-index-refresh', daemon=True).start()
+
+
+search_index = SearchIndex()
+
+#----------------------------------------------------------------------------#
+# Incremental updates.
+#
+# Documents are rendered at flush time, while the changed objects are still
+# loaded, and applied only once the transaction commits.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'after_flush')
+def collect_search_changes(session, flush_context):
+  pending = session.info.setdefault('search_changes', [])
+  now = datetime.now()
+  for obj in list(session.new) + list(session.dirty):
+    if isinstance(obj, Venue):
+      pending.append(('add', venue_document(obj)))
+      related = obj.show
+    elif isinstance(obj, Artist):
+      pending.append(('add', artist_document(obj)))
+      related = obj.show
+    elif isinstance(obj, Show):
+      related = [obj]
+    else:
+      continue
+    # Show documents repeat the artist and venue names, so re-render them too.
+    for show in related:
+      if show.start_time > now:
+        pending.append(('add', show_document(show)))
+
+  for obj in session.deleted:
+    if isinstance(obj, Venue):
+      pending.append(('remove', ('venue', obj.id)))
+    elif isinstance(obj, Artist):
+      pending.append(('remove', ('artist', obj.id)))
+    elif isinstance(obj, Show):
+      pending.append(('remove', ('show', obj.id)))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_search_changes(session):
+  search_index.apply(session.info.pop('search_changes', []))
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_search_changes(session):
+  session.info.pop('search_changes', None)
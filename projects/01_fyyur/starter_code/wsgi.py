@@ -0,0 +1,24 @@
+#----------------------------------------------------------------------------#
+# Production entry point.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# gunicorn.conf.py sets preload_app, so this module is imported once in the
+# master process and the app (templates, forms, models) is shared with the
+# workers copy-on-write after fork.
+#----------------------------------------------------------------------------#
+
+import os
+from app import create_app
+from models import db
+from recommendations import recommender
+from search_index import search_index
+
+app = create_app(os.environ.get('FYYUR_CONFIG', 'config.ProductionConfig'))
+
+# Build the in-memory indexes once here so every worker inherits them, then
+# close the connections used to do it before gunicorn forks.
+with app.app_context():
+  recommender.load()
+  search_index.ensure_loaded(app.config.get('SEARCH_INDEX_SNAPSHOT'))
+  db.engine.dispose()
@@ -0,0 +1,125 @@
+'''
+Compares the Flask app with its ASGI variant (flaskr/asgi.py) under
+concurrent load, against the same local database.
+
+Each app is started with the same number of worker processes (gunicorn
+sync workers for Flask, uvicorn for the ASGI app), then every endpoint is
+hit with increasing numbers of concurrent clients:
+
+    pip install -r requirements-async.txt
+    python benchmarks/bench_async.py --workers 2 --concurrency 1 10 50 200
+
+Both apps use the database configured in models.py, or --database-url
+(e.g. sqlite:////tmp/trivia.db). The Flask app's rate limit and
+concurrency cap are raised out of the way, since every request comes
+from this one address.
+'''
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SERVERS = {
+  'flask': ['gunicorn', '--workers', '{workers}', '--bind', '127.0.0.1:{port}', 'flaskr:create_app()'],
+  'asgi': ['uvicorn', '--factory', '--workers', '{workers}', '--port', '{port}', '--log-level', 'warning',
+           'flaskr.asgi:create_asgi_app']
+}
+
+# Passed to both servers; see load_settings() in flaskr/__init__.py.
+SETTINGS = {
+  'TRIVIA_RATE_LIMIT_PER_SECOND': '1000000000',
+  'TRIVIA_RATE_LIMIT_BURST': '1000000000',
+  'TRIVIA_MAX_CONCURRENT_REQUESTS': '1000000'
+}
+
+REQUESTS = {
+  'categories': ('GET', '/categories', None),
+  'questions': ('GET', '/questions?page=1', None),
+  'search': ('POST', '/questions', {'searchTerm': 'title'}),
+  'quiz': ('POST', '/quizzes', {'previous_questions': [], 'quiz_category': {'id': 0}})
+}
+
+
+def start(name, port, workers, database_url=None):
+  command = [part.format(port=port, workers=workers) for part in SERVERS[name]]
+  environment = dict(os.environ, **SETTINGS)
+  if database_url:
+    environment['TRIVIA_SQLALCHEMY_DATABASE_URI'] = database_url
+  # A session of its own, so stop() reaches the workers as well.
+  server = subprocess.Popen(command, cwd=BACKEND, env=environment, start_new_session=True)
+  deadline = time.time() + 30
+  while time.time() < deadline:
+    try:
+      httpx.get('http://127.0.0.1:{}/categories'.format(port)).raise_for_status()
+      return server
+    except httpx.HTTPError:
+      time.sleep(0.2)
+  stop(server)
+  sys.exit('{} did not start on port {}'.format(name, port))
+
+
+def stop(server):
+  os.killpg(server.pid, signal.SIGTERM)
+  try:
+    server.wait(timeout=10)
+  except subprocess.TimeoutExpired:
+    os.killpg(server.pid, signal.SIGKILL)
+    server.wait()
+
+
+async def load(port, request, concurrency, total):
+  method, path, body = request
+  latencies = []
+
+  async def client(http, count):
+    for _ in range(count):
+      start = time.perf_counter()
+      response = await http.request(method, path, json=body)
+      response.raise_for_status()
+      latencies.append((time.perf_counter() - start) * 1000)
+
+  limits = httpx.Limits(max_connections=concurrency)
+  async with httpx.AsyncClient(base_url='http://127.0.0.1:{}'.format(port), limits=limits, timeout=60) as http:
+    start = time.perf_counter()
+    await asyncio.gather(*[client(http, total // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+  latencies.sort()
+  return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--workers', type=int, default=2)
+  parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 200])
+  parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint and concurrency level')
+  parser.add_argument('--database-url', help='database for both apps instead of the one in models.py')
+  args = parser.parse_args()
+
+  results = {}
+  for port, name in enumerate(SERVERS, start=5101):
+    server = start(name, port, args.workers, args.database_url)
+    try:
+      for endpoint, request in REQUESTS.items():
+        for concurrency in args.concurrency:
+          results[name, endpoint, concurrency] = asyncio.run(load(port, request, concurrency, args.requests))
+    finally:
+      stop(server)
+
+  print('{:<12} {:>6}  {:>22}  {:>22}'.format('endpoint', 'conc', 'flask req/s p50/p99 ms', 'asgi req/s p50/p99 ms'))
+  for endpoint in REQUESTS:
+    for concurrency in args.concurrency:
+      cells = ['{:>7.0f} {:>6.1f} {:>7.1f}'.format(*results[name, endpoint, concurrency]) for name in SERVERS]
+      print('{:<12} {:>6}  {:>22}  {:>22}'.format(endpoint, concurrency, *cells))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,73 @@
+'''
+Times the category queries behind /categories/<id>/questions and /quizzes.
+
+Run it before and after `flask upgrade-question-category` against the same
+database to compare the text column with the indexed integer foreign key:
+
+    python benchmarks/bench_category_queries.py --seed 200000
+    flask upgrade-question-category
+    python benchmarks/bench_category_queries.py
+
+--seed adds that many synthetic questions first (PostgreSQL only).
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import database_path
+
+QUERIES = {
+  'page of category': 'SELECT id, question, answer, difficulty, category FROM questions '
+                      'WHERE category = :category ORDER BY id LIMIT 10',
+  'count of category': 'SELECT count(*) FROM questions WHERE category = :category',
+  'quiz candidates': 'SELECT id FROM questions WHERE category = :category AND id NOT IN (1, 2, 3)'
+}
+
+
+def seed(connection, rows, text_category):
+  category = "(1 + n % 6){}".format('::text' if text_category else '')
+  connection.execute(text(
+    'INSERT INTO questions (question, answer, difficulty, category) '
+    "SELECT 'Synthetic question ' || n, 'Answer ' || n, 1 + n % 5, {} "
+    'FROM generate_series(1, :rows) AS n'.format(category)), {'rows': rows})
+  connection.execute(text('ANALYZE questions'))
+
+
+def time_query(connection, sql, params, repeat):
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    connection.execute(text(sql), params).fetchall()
+    timings.append((time.perf_counter() - start) * 1000)
+  return statistics.median(timings)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--database', default=os.environ.get('DATABASE_URL', database_path))
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--repeat', type=int, default=50)
+  args = parser.parse_args()
+
+  engine = create_engine(args.database)
+  column = next(column for column in inspect(engine).get_columns('questions') if column['name'] == 'category')
+  text_category = column['type'].python_type is not int
+
+  with engine.begin() as connection:
+    if args.seed:
+      seed(connection, args.seed, text_category)
+    total = connection.execute(text('SELECT count(*) FROM questions')).scalar()
+
+  print('questions.category is {} ({} rows)'.format('text' if text_category else 'integer', total))
+  params = {'category': '3' if text_category else 3}
+  with engine.connect() as connection:
+    for name, sql in QUERIES.items():
+      plan = connection.execute(text('EXPLAIN ' + sql), params).fetchall()
+      scan = next((line[0].strip() for line in plan if 'Scan' in line[0]), plan[0][0])
+      print('{:<18} {:>9.3f} ms   {}'.format(name, time_query(connection, sql, params, args.repeat), scan))
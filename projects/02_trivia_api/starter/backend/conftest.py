@@ -0,0 +1,129 @@
+import os
+import re
+import time
+
+import pytest
+from sqlalchemy import event
+
+from flaskr import create_app
+from models import db, Question, Category
+
+# Defaults to a private in-memory SQLite database per worker. To run against
+# Postgres, point this at databases restored from trivia.psql and
+# trivia_search.psql; {worker} is replaced by the pytest-xdist worker id
+# (gw0, gw1, ... or 'main' without xdist), e.g.
+#   TEST_DATABASE_URL=postgresql://localhost:5432/trivia_test_{worker}
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+
+SEED_FILE = os.path.join(os.path.dirname(__file__), 'trivia.psql')
+
+
+def copy_rows(sql, table):
+  # The tab separated rows of a COPY ... FROM stdin block in a pg_dump file.
+  block = re.search(r'COPY public\.{} \((.*?)\) FROM stdin;\n(.*?)\\\.'.format(table), sql, re.S)
+  columns = block.group(1).split(', ')
+  return [dict(zip(columns, line.split('\t'))) for line in block.group(2).splitlines()]
+
+
+def seed(session=None):
+  # Into the Flask-SQLAlchemy session unless another one is given.
+  session = session or db.session
+  with open(SEED_FILE) as seed_file:
+    sql = seed_file.read()
+
+  for row in copy_rows(sql, 'categories'):
+    category = Category(type=row['type'])
+    category.id = int(row['id'])
+    session.add(category)
+  for row in copy_rows(sql, 'questions'):
+    question = Question(question=row['question'], answer=row['answer'],
+                        category=int(row['category']), difficulty=int(row['difficulty']))
+    question.id = int(row['id'])
+    session.add(question)
+  session.commit()
+
+
+@pytest.fixture(scope='session')
+def app():
+  '''
+  One app, engine and schema per worker. An in-memory SQLite database is
+  created and seeded from trivia.psql here; a Postgres database is used as
+  it is.
+  '''
+  worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+  # The whole worker shares one client address, so the rate limit is raised
+  # out of the way; tests that exercise it adjust the limiter directly.
+  # Answer stats are flushed by the tests themselves, inside their
+  # transaction, rather than by the background thread.
+  config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URL.format(worker=worker),
+            'RATE_LIMIT_BURST': 100000, 'STATS_FLUSH_SECONDS': 0, 'API_KEYS': ['rate-limit-test']}
+  if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # pysqlite issues its own BEGIN/COMMIT and breaks SAVEPOINTs; take over
+    # transaction control so the per-test savepoints below work.
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'isolation_level': None}}
+
+  app = create_app(config)
+  with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+      @event.listens_for(db.engine, 'begin')
+      def begin(connection):
+        connection.execute('BEGIN')
+
+      if Category.query.count() == 0:
+        seed()
+        app.extensions['questions_changed'](reload=True)
+
+  return app
+
+
+@pytest.fixture
+def db_session(app):
+  '''
+  Runs the test inside a transaction that is rolled back afterwards. The
+  app's own commits and rollbacks only end a SAVEPOINT, which is reopened
+  straight away, so nothing a test writes reaches the database.
+  '''
+  with app.app_context():
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    session = db.create_scoped_session(options={'bind': connection, 'binds': {}})
+    savepoint = [connection.begin_nested()]
+
+    @event.listens_for(session, 'after_transaction_end')
+    def restart_savepoint(_session, _transaction):
+      if not savepoint[0].is_active:
+        savepoint[0] = connection.begin_nested()
+
+    app_session, db.session = db.session, session
+    try:
+      yield session
+    finally:
+      db.session = app_session
+      session.remove()
+      transaction.rollback()
+      connection.close()
+      app.extensions['questions_changed'](reload=True)
+
+
+def pytest_sessionstart(session):
+  session.config._trivia_started = time.perf_counter()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+  # Keeps the last 20 suite times in the pytest cache so a slowdown shows
+  # up next to the previous runs.
+  # Nothing to compare against under -p no:cacheprovider.
+  cache = getattr(config, 'cache', None)
+  if cache is None:
+    return
+
+  seconds = time.perf_counter() - config._trivia_started
+  history = cache.get('trivia/suite_seconds', [])
+  history = (history + [round(seconds, 3)])[-20:]
+  cache.set('trivia/suite_seconds', history)
+
+  previous = history[:-1]
+  summary = 'trivia suite: {:.2f}s'.format(seconds)
+  if previous:
+    summary += ' (previous {:.2f}s, best of last {} {:.2f}s)'.format(previous[-1], len(previous), min(previous))
+  terminalreporter.write_line(summary)
@@ -1,32 +1,301 @@
 import os
-from flask import Flask, request, abort, jsonify, redirect, url_for
+import atexit
+import click
+import time
+from flask import Flask, request, abort, jsonify, redirect, url_for, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.sql.expression import func
+from sqlalchemy import event
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import random
 import math
 
-from models import setup_db, Question, Category, db
+from models import setup_db, database_path, Question, db
+from .caches import CategoryCache, QuestionCountCache, SearchResultCache, ResponseCache
+from .sampler import QuestionSampler, QUESTIONS_PER_QUIZ, difficulty_curve
+from .sessions import QuizSessionStore
+from .decks import encode_deck, decode_deck
+from .limits import RateLimiter, ConcurrencyLimiter, pool_capacity
+from .metrics import Metrics
+from .duplicates import DuplicateIndex, signature
+from .answers import AnswerChecker, MAX_GUESS_LENGTH
+from .stats import AnswerStats
+from .search import QuestionSearch
+from .bulk import export_questions, read_records, import_questions, text_lines, validate
+from .category_fk import upgrade_question_category_command
 
 QUESTIONS_PER_PAGE = 10
+MAX_BATCH_SIZE = 1000
+MAX_QUIZ_LENGTH = 50
+
+
+def comma_list(value):
+  return [item.strip() for item in value.split(',') if item.strip()]
+
+def flag(value):
+  return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+# Settings that can be given as TRIVIA_<NAME> environment variables, and how
+# to parse them.
+ENVIRONMENT_SETTINGS = {
+  'SQLALCHEMY_DATABASE_URI': str,
+  'RATE_LIMIT_PER_SECOND': float,
+  'RATE_LIMIT_BURST': int,
+  'MAX_CONCURRENT_REQUESTS': int,
+  'API_KEYS': comma_list,
+  'PROXY_COUNT': int,
+  'DUPLICATE_THRESHOLD': float,
+  'DUPLICATE_QUESTIONS': str,
+  'ANSWER_MATCH_THRESHOLD': float,
+  'LEADERBOARD_SIZE': int,
+  'STATS_FLUSH_SECONDS': float,
+  'WARM_UP': flag
+}
+
+def load_settings(config):
+  # A settings file named by TRIVIA_SETTINGS first, then the environment.
+  # config is a flask.Config (the ASGI app has no Flask app to hang it on).
+  config.from_envvar('TRIVIA_SETTINGS', silent=True)
+  for name, parse in ENVIRONMENT_SETTINGS.items():
+    value = os.environ.get('TRIVIA_' + name)
+    if value is not None:
+      config[name] = parse(value)
 
 def paginate_questions(request, selection):
-  page = request.args.get('page', 1, type=int)
-  start = (page - 1) * QUESTIONS_PER_PAGE
-  end = start + QUESTIONS_PER_PAGE
-
-  questions = [question.format() for question in selection]
-  current_questions = questions[start:end]
-
-  return current_questions
+  # selection is a Question query that has not been run yet. Only the requested
+  # page is fetched: ?page=n uses LIMIT/OFFSET, ?cursor=<id> returns the questions
+  # after that id (keyset pagination on Question.id), which stays O(page size)
+  # however deep the client pages.
+  page = max(request.args.get('page', 1, type=int), 1)
+  cursor = request.args.get('cursor', None, type=int)
+
+  selection = selection.order_by(None).order_by(Question.id)
+  if cursor is not None:
+    selection = selection.filter(Question.id > cursor)
+  else:
+    selection = selection.offset((page - 1) * QUESTIONS_PER_PAGE)
+
+  # Fetch one extra row to find out whether there is a next page.
+  rows = selection.limit(QUESTIONS_PER_PAGE + 1).all()
+  has_more = len(rows) > QUESTIONS_PER_PAGE
+  current_questions = [question.format() for question in rows[:QUESTIONS_PER_PAGE]]
+
+  page_info = {
+    'has_more': has_more,
+    'next_cursor': current_questions[-1]['id'] if has_more else None
+  }
+
+  return current_questions, page_info
 
 def create_app(test_config=None):
     # Create the app
     app = Flask(__name__)
-    setup_db(app)
+    load_settings(app.config)
+    if test_config is not None:
+      app.config.from_mapping(test_config)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+
+    # Question totals per category, shared by the listing endpoints and
+    # invalidated whenever a question is inserted or deleted.
+    question_counts = QuestionCountCache()
+
+    # Categories are read by almost every endpoint but rarely change, so they
+    # are loaded once here and served from memory.
+    categories = CategoryCache()
+
+    # Question ids per category, used to pick quiz questions at random.
+    sampler = QuestionSampler()
+
+    # Quiz sessions started with POST /quizzes/sessions.
+    quiz_sessions = QuizSessionStore()
+
+    # Full-text search over questions and answers (see search.py).
+    question_search = QuestionSearch()
+
+    # Pages of search results by normalized term, dropped on every write.
+    search_results = SearchResultCache()
+
+    # MinHash/LSH index used to catch reworded copies of existing questions.
+    duplicate_index = DuplicateIndex(app.config.get('DUPLICATE_THRESHOLD', 0.7))
+
+    # Normalized forms of every answer, for POST /quizzes/answer.
+    answer_checker = AnswerChecker(app.config.get('ANSWER_MATCH_THRESHOLD', 0.85))
+
+    # Answer counts per question and player, written to the database in
+    # batches every STATS_FLUSH_SECONDS (0 leaves flushing to the caller),
+    # and the leaderboard kept in memory (see stats.py).
+    answer_stats = AnswerStats(app.config.get('LEADERBOARD_SIZE', 10))
+
+    # Admission control (see limits.py): a token bucket per client, keyed by
+    # an X-API-Key listed in API_KEYS or else the remote address, and a cap
+    # on requests in flight that defaults to the size of the database pool.
+    rate_limiter = RateLimiter(app.config.get('RATE_LIMIT_PER_SECOND', 20), app.config.get('RATE_LIMIT_BURST', 40))
+    concurrency_limiter = ConcurrencyLimiter()
+    api_keys = frozenset(app.config.get('API_KEYS') or ())
+
+    # Behind PROXY_COUNT reverse proxies the client address is taken from
+    # X-Forwarded-For; without proxies the header is not trusted.
+    if app.config.get('PROXY_COUNT'):
+      app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'])
+
+    # Request timings and counts per route, served at /metrics.
+    metrics = Metrics()
+
+    with app.app_context():
+      # The caches load themselves on first use as well. WARM_UP=0 skips
+      # loading them here, for CLI commands that must run against a schema
+      # the caches can't read yet (upgrade-question-category).
+      if app.config.get('WARM_UP', True):
+        categories.load()
+        sampler.load()
+        duplicate_index.load()
+        answer_checker.load()
+      question_search.setup()
+      answer_stats.load()
+      concurrency_limiter.max_in_flight = app.config.get('MAX_CONCURRENT_REQUESTS') or pool_capacity(db.engine)
+
+      @event.listens_for(db.engine, 'before_cursor_execute')
+      def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info['statement_started'] = time.perf_counter()
+
+      @event.listens_for(db.engine, 'after_cursor_execute')
+      def finish_statement(conn, cursor, statement, parameters, context, executemany):
+        metrics.add_db_time(time.perf_counter() - conn.info.pop('statement_started'))
+
+    if app.config.get('STATS_FLUSH_SECONDS', 5):
+      answer_stats.start(app, app.config.get('STATS_FLUSH_SECONDS', 5))
+
+      # Whatever was recorded since the last flush is written on the way out.
+      @atexit.register
+      def flush_answer_stats():
+        with app.app_context():
+          try:
+            answer_stats.flush()
+          except Exception:
+            app.logger.exception('Could not write answer stats')
+
+    # Every committed write to questions is reported here so the in-memory
+    # caches stay current. added is [(id, category, difficulty)], deleted is
+    # [id]; reload re-reads everything when the changed ids aren't known.
+    def questions_changed(added=(), deleted=(), reload=False):
+      question_counts.invalidate()
+      search_results.invalidate()
+      bootstrap.invalidate()
+      if reload:
+        sampler.load()
+        duplicate_index.load()
+        answer_checker.load()
+        return
+      for question_id, category, difficulty in added:
+        sampler.add(question_id, category, difficulty)
+      for question_id in deleted:
+        sampler.remove(question_id)
+        duplicate_index.remove(question_id)
+        answer_checker.forget(question_id)
+        answer_stats.forget(question_id)
+
+    def describe_duplicates(duplicates):
+      similarities = dict(duplicates)
+      questions = Question.query.filter(Question.id.in_(similarities)).all() if similarities else []
+      return sorted([{'id': question.id, 'question': question.question, 'similarity': round(similarities[question.id], 2)}
+                     for question in questions], key=lambda duplicate: -duplicate['similarity'])
+
+    def rejects_duplicates(entry):
+      return app.config.get('DUPLICATE_QUESTIONS', 'reject') == 'reject' and not entry.get('allow_duplicate')
+
+    # The test fixtures roll back every test's writes behind the caches' back
+    # and resync them through this.
+    app.extensions['questions_changed'] = questions_changed
+    app.extensions['rate_limiter'] = rate_limiter
+    app.extensions['concurrency_limiter'] = concurrency_limiter
+    app.extensions['answer_stats'] = answer_stats
 
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+    app.cli.add_command(upgrade_question_category_command)
+
+    # Registered ahead of admit_request so that requests turned away are
+    # timed and counted too.
+    @app.before_request
+    def start_timer():
+      g.started = metrics.start_request()
+
+    @app.after_request
+    def record_request(response):
+      if 'started' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.finish_request(route, request.method, response.status_code, g.started)
+      return response
+
+    @app.teardown_request
+    def stop_timer(error):
+      if g.pop('started', None) is not None:
+        metrics.end_request()
+
+    # Endpoint that serves the request metrics and admission counters of this
+    # process in the Prometheus text format.
+    @app.route('/metrics')
+    def retrieve_metrics():
+      rate_limit = rate_limiter.stats()
+      concurrency = concurrency_limiter.stats()
+      search_cache = search_results.stats()
+      body = metrics.render([
+        ('trivia_rate_limited_total', 'counter', 'Requests turned away with 429.', rate_limit['rejected']),
+        ('trivia_rate_limit_clients', 'gauge', 'Clients with a token bucket.', rate_limit['clients']),
+        ('trivia_concurrency_limited_total', 'counter', 'Requests turned away with 503.', concurrency['rejected']),
+        ('trivia_concurrency_peak', 'gauge', 'Most requests admitted at once.', concurrency['peak']),
+        ('trivia_search_cache_hits_total', 'counter', 'Searches answered from the result cache.', search_cache['hits']),
+        ('trivia_search_cache_misses_total', 'counter', 'Searches that ran against the database.', search_cache['misses']),
+        ('trivia_search_cache_hit_rate', 'gauge', 'Share of searches answered from the result cache.', search_cache['hit_rate']),
+        ('trivia_search_cache_entries', 'gauge', 'Pages held in the search result cache.', search_cache['entries']),
+        ('trivia_answer_stats_pending', 'gauge', 'Answers recorded but not written to the database yet.', answer_stats.pending()),
+        ('trivia_answer_stats_flushes_total', 'counter', 'Batches of answer stats written.', answer_stats.flushes)
+      ])
+      return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
+    def turn_away(status, message, retry_after):
+      response = jsonify({
+        "success": False,
+        "error": status,
+        "message": message
+        })
+      response.status_code = status
+      response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+      return response
+
+    # Requests over the client's rate get 429, and requests past the in-flight
+    # cap get 503, both before they reach the database.
+    @app.before_request
+    def admit_request():
+      if request.method == 'OPTIONS' or request.endpoint in ('retrieve_admission_stats', 'retrieve_metrics'):
+        return None
+
+      # Unknown keys count against the address, so they can't be used to get
+      # fresh buckets or to push known clients out of the limiter.
+      api_key = request.headers.get('X-API-Key')
+      client = 'key:' + api_key if api_key in api_keys else 'ip:' + str(request.remote_addr)
+      retry_after = rate_limiter.take(client)
+      if retry_after:
+        return turn_away(429, 'too many requests', retry_after)
+
+      if not concurrency_limiter.acquire():
+        return turn_away(503, 'service unavailable', 1)
+      g.admitted = True
+
+    @app.teardown_request
+    def release_request(error):
+      if g.pop('admitted', False):
+        concurrency_limiter.release()
+
+    # Endpoint that reports the admission control counters of this process.
+    @app.route('/admission')
+    def retrieve_admission_stats():
+      return jsonify({
+        'success': True,
+        'rate_limit': rate_limiter.stats(),
+        'concurrency': concurrency_limiter.stats()
+      })
+
     # CORS Headers
     @app.after_request
     def after_request(response):
@@ -34,29 +303,73 @@ def create_app(test_config=None):
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
         return response
 
-    # Endpoint to return all categories
+    # Endpoint to return all categories. With ?counts=true the response also
+    # includes the number of questions in each category.
     @app.route('/categories')
     def retrieve_categories():
-      categories = Category.query.order_by(Category.id).all()
-      formatted_categories = {category.id: category.type for category in categories}
+      formatted_categories = categories.formatted()
 
-      if len(categories) == 0:
+      if len(formatted_categories) == 0:
         abort(404)
 
+      if request.args.get('counts', 'false').lower() != 'true':
+        return app.response_class(categories.response_body(), mimetype='application/json')
+
+      counts = question_counts.counts()
+
       return jsonify({
         'success': True,
-        'categories': formatted_categories
+        'categories': formatted_categories,
+        'question_counts': {category_id: counts.get(category_id, 0) for category_id in formatted_categories}
       })
 
+    # Everything the frontend needs for its first screen, built from the
+    # caches above and kept compressed until the next write (see
+    # retrieve_bootstrap).
+    def build_bootstrap():
+      formatted_categories = categories.formatted()
+      counts = question_counts.counts()
+      rows = Question.query.order_by(Question.id).limit(QUESTIONS_PER_PAGE + 1).all()
+      current_questions = [question.format() for question in rows[:QUESTIONS_PER_PAGE]]
+      has_more = len(rows) > QUESTIONS_PER_PAGE
+
+      return {
+        'success': True,
+        'categories': formatted_categories,
+        'question_counts': {category_id: counts.get(category_id, 0) for category_id in formatted_categories},
+        'questions': current_questions,
+        'total_questions': question_counts.total(),
+        'current_category': categories.first(),
+        'has_more': has_more,
+        'next_cursor': current_questions[-1]['id'] if has_more else None
+      }
+
+    bootstrap = ResponseCache(build_bootstrap)
+
+    # Endpoint that returns the categories with their question counts, the
+    # first page of questions and the totals in one response, gzipped when
+    # the client accepts it.
+    @app.route('/bootstrap')
+    def retrieve_bootstrap():
+      body, compressed, etag = bootstrap.get()
+
+      if 'gzip' in request.accept_encodings:
+        response = app.response_class(compressed, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        etag += '-gzip'
+      else:
+        response = app.response_class(body, mimetype='application/json')
+      response.headers['Vary'] = 'Accept-Encoding'
+      response.set_etag(etag)
+      return response.make_conditional(request)
+
     # Endpoint to return all questions
     @app.route('/questions')
     def retrieve_questions():
-      selection = Question.query.order_by(Question.id).all()
-      current_questions = paginate_questions(request, selection)
-      total_questions = len(Question.query.all())
-      categories = Category.query.order_by(Category.id).all()
-      formatted_categories = {category.id: category.type for category in categories}
-      current_category = Category.query.order_by(Category.id).first()
+      current_questions, page_info = paginate_questions(request, Question.query)
+      total_questions = question_counts.total()
+      formatted_categories = categories.formatted()
+      current_category = categories.first()
 
       if len(current_questions) == 0:
         abort(404)
@@ -66,7 +379,9 @@ def create_app(test_config=None):
         'questions': current_questions,
         'total_questions': total_questions,
         'categories': formatted_categories,
-        'current_category': {current_category.id: current_category.type}
+        'current_category': current_category,
+        'has_more': page_info['has_more'],
+        'next_cursor': page_info['next_cursor']
       })
 
     # Endpoint to delete a question from the database
@@ -80,6 +395,7 @@ def create_app(test_config=None):
 
         db.session.delete(question)
         db.session.commit()
+        questions_changed(deleted=[question_id])
         
       except:
         db.session.rollback()
@@ -103,18 +419,38 @@ def create_app(test_config=None):
       search_term = body.get('searchTerm')
 
       if search_term:
-        search_matches = Question.query.order_by(Question.id).filter(Question.question.ilike('%{}%'.format(search_term)))
-        current_questions = paginate_questions(request, search_matches)
-        total_questions = len(search_matches.all())
-        current_category = Category.query.order_by(Category.id).first()
+        # Results are ordered by relevance, so they page by ?page= only.
+        page = max(request.args.get('page', 1, type=int), 1)
+        generation = search_results.generation
+        result = search_results.get(search_term, page)
+        if result is None:
+          result = question_search.search(search_term, page, QUESTIONS_PER_PAGE)
+          search_results.put(search_term, page, result, generation)
+        current_questions, total_questions, has_more = result
+        current_category = categories.first()
 
         return jsonify({
           'success': True,
           'questions': current_questions,
           'total_questions': total_questions,
-          'current_category': {current_category.id: current_category.type}
+          'current_category': current_category,
+          'has_more': has_more,
+          'next_cursor': None
         })
       else:
+        # Near-duplicates of existing questions are turned away with 409, unless
+        # the body sets allow_duplicate or DUPLICATE_QUESTIONS is 'flag'; either
+        # way they are listed in the response.
+        question_signature = signature(body.get('question'))
+        duplicates = duplicate_index.find(body.get('question'), question_signature) if body.get('question') else []
+        if duplicates and rejects_duplicates(body):
+          return jsonify({
+            "success": False,
+            "error": 409,
+            "message": "duplicate question",
+            "duplicates": describe_duplicates(duplicates)
+            }), 409
+
         try:
           question = body.get('question', None)
           answer = body.get('answer', None)
@@ -124,6 +460,8 @@ def create_app(test_config=None):
           new_question = Question(question=question,answer=answer,category=category,difficulty=difficulty)
           db.session.add(new_question)
           db.session.commit()
+          questions_changed(added=[(new_question.id, new_question.category, new_question.difficulty)])
+          duplicate_index.add(new_question.id, question_signature)
         except:
           db.session.rollback()
           abort(422)
@@ -133,16 +471,17 @@ def create_app(test_config=None):
 
         return jsonify({
           'success': True,
-          'question_id': new_question_id
+          'question_id': new_question_id,
+          'duplicates': describe_duplicates(duplicates)
         })
     
     # Endpoint to return questions in a specified category
     @app.route('/categories/<int:category_id>/questions')
     def retrieve_questions_by_category(category_id):
-      selection = Question.query.order_by(Question.id).filter(Question.category == category_id)
-      total_questions = len(selection.all())
-      current_questions = paginate_questions(request, selection)
-      current_category = Category.query.get(category_id)
+      selection = Question.query.filter(Question.category == category_id)
+      total_questions = question_counts.for_category(category_id)
+      current_questions, page_info = paginate_questions(request, selection)
+      current_category = categories.get(category_id)
 
       if total_questions == 0:
         abort(404)
@@ -151,7 +490,9 @@ def create_app(test_config=None):
         'success': True,
         'questions': current_questions,
         'total_questions': total_questions,
-        'current_category': {current_category.id: current_category.type}
+        'current_category': current_category,
+        'has_more': page_info['has_more'],
+        'next_cursor': page_info['next_cursor']
       })
 
 
@@ -159,15 +500,44 @@ def create_app(test_config=None):
     # (by category if specified), not including previous questions. 
     @app.route('/quizzes', methods=['POST'])
     def create_quiz():
-      body = request.get_json()
+      body = request.get_json(silent=True) or {}
 
-      previous_questions = body.get('previous_questions', None)
-      quiz_category = body.get('quiz_category', None)
+      previous_questions = body.get('previous_questions', None) or []
+      quiz_category = body.get('quiz_category', None) or {'id': 0}
 
-      if quiz_category['id'] == 0:
-        current_question = Question.query.filter(Question.id.notin_(previous_questions)).order_by(func.random()).first()
-      else:
-        current_question = Question.query.filter(Question.category == quiz_category['id']).filter(Question.id.notin_(previous_questions)).order_by(func.random()).first()
+      # Optional difficulty_curve: a list of difficulties, one per question, or
+      # {'start': 1, 'end': 5} to ramp over the quiz. With quiz_length the
+      # rest of the quiz is returned at once instead of the next question.
+      try:
+        category_id = int(quiz_category['id'])
+        quiz_length = int(body['quiz_length']) if body.get('quiz_length') is not None else None
+        curve = None
+        if body.get('difficulty_curve') is not None:
+          curve_length = len(previous_questions) + quiz_length if quiz_length else QUESTIONS_PER_QUIZ
+          curve = difficulty_curve(body['difficulty_curve'], curve_length)
+      except (KeyError, TypeError, ValueError):
+        abort(400)
+      if quiz_length is not None and not 1 <= quiz_length <= MAX_QUIZ_LENGTH:
+        abort(400)
+
+      if category_id != 0 and categories.get(category_id) is None:
+        abort(404)
+
+      def target_difficulty(position):
+        return curve[min(position, len(curve) - 1)] if curve else None
+
+      if quiz_length is not None:
+        positions = range(len(previous_questions), len(previous_questions) + quiz_length)
+        questions = sampler.sample_quiz(category_id,
+                                        [target_difficulty(position) for position in positions],
+                                        previous_questions)
+        return jsonify({
+          'success': True,
+          'questions': [question.format() for question in questions]
+        })
+
+      current_question = sampler.sample_question(category_id, previous_questions,
+                                                 target_difficulty(len(previous_questions)))
 
       if current_question:
         current_question = current_question.format()
@@ -177,6 +547,317 @@ def create_app(test_config=None):
         'question': current_question
       })  
 
+    # Endpoint that checks a quiz answer on the server, forgiving case,
+    # punctuation, articles, word order and small typos (see answers.py).
+    # The answer is counted towards the question's stats and, with 'player',
+    # the player's score.
+    @app.route('/quizzes/answer', methods=['POST'])
+    def check_quiz_answer():
+      body = request.get_json(silent=True) or {}
+      try:
+        question_id = int(body['question_id'])
+        guess = str(body['answer'])
+      except (KeyError, TypeError, ValueError):
+        abort(400)
+      if len(guess) > MAX_GUESS_LENGTH:
+        abort(400)
+
+      player = body.get('player')
+      if player is not None:
+        player = str(player).strip()
+        if not 0 < len(player) <= 64:
+          abort(400)
+
+      result = answer_checker.check(question_id, guess)
+      if result is None:
+        abort(404)
+
+      answer_stats.record(question_id, result['correct'], player)
+      return jsonify(dict(result, success=True, question_id=question_id))
+
+    # Endpoint that returns the players with the most correct answers, from
+    # memory. Answers show up here at once, before they are written.
+    @app.route('/leaderboard')
+    def retrieve_leaderboard():
+      limit = request.args.get('limit', answer_stats.top, type=int)
+      if limit < 1:
+        abort(400)
+
+      return jsonify({
+        'success': True,
+        'leaders': answer_stats.leaderboard(limit)
+      })
+
+    # Endpoint that creates many questions in one transaction. Each entry of
+    # 'questions' is validated on its own; the valid ones are inserted together
+    # and the response reports the outcome for every entry, in order.
+    @app.route('/questions/batch', methods=['POST'])
+    def create_questions_batch():
+      body = request.get_json(silent=True)
+      entries = body.get('questions') if isinstance(body, dict) else None
+      if not isinstance(entries, list) or not entries or len(entries) > MAX_BATCH_SIZE:
+        abort(400)
+
+      category_ids = set(categories.formatted())
+      results = []
+      created = []
+      for index, entry in enumerate(entries):
+        row, error = validate(entry, category_ids) if isinstance(entry, dict) else (None, 'expected an object')
+        if error is not None:
+          results.append({'index': index, 'status': 'invalid', 'error': error})
+          continue
+        question_signature = signature(row['question'])
+        duplicate_ids = [question_id for question_id, similarity in duplicate_index.find(row['question'], question_signature)]
+        if duplicate_ids and rejects_duplicates(entry):
+          results.append({'index': index, 'status': 'duplicate', 'duplicates': duplicate_ids})
+          continue
+        result = {'index': index, 'status': 'created'}
+        if duplicate_ids:
+          result['duplicates'] = duplicate_ids
+        results.append(result)
+        created.append((result, row, question_signature))
+
+      try:
+        rows = [row for result, row, question_signature in created]
+        if not rows:
+          ids = []
+        elif db.session.connection().dialect.implicit_returning:
+          # One multi-row INSERT ... RETURNING. The ids come from the
+          # sequence in VALUES order, so sorting them lines them up with rows.
+          ids = sorted(question_id for question_id, in db.session.execute(
+            Question.__table__.insert().values(rows).returning(Question.id)))
+        else:
+          # SQLite (tests and local runs) has no RETURNING here.
+          questions = [Question(**row) for row in rows]
+          db.session.add_all(questions)
+          db.session.flush()
+          ids = [question.id for question in questions]
+        db.session.commit()
+        added = []
+        signatures = []
+        for (result, row, question_signature), question_id in zip(created, ids):
+          result['id'] = question_id
+          added.append((question_id, row['category'], row['difficulty']))
+          signatures.append((question_id, question_signature))
+      except:
+        db.session.rollback()
+        abort(422)
+      finally:
+        db.session.close()
+
+      questions_changed(added=added)
+      for question_id, question_signature in signatures:
+        duplicate_index.add(question_id, question_signature)
+
+      return jsonify({
+        'success': True,
+        'created': len(added),
+        'failed': len(results) - len(added),
+        'results': results
+      })
+
+    # Endpoint that deletes every question in ?ids=1,2,3 with a single DELETE
+    # and reports which ids were deleted and which didn't exist.
+    @app.route('/questions', methods=['DELETE'])
+    def delete_questions_batch():
+      try:
+        question_ids = [int(question_id) for question_id in request.args.get('ids', '').split(',') if question_id.strip()]
+      except ValueError:
+        abort(400)
+      if not question_ids or len(question_ids) > MAX_BATCH_SIZE:
+        abort(400)
+
+      try:
+        existing = {question_id for (question_id,) in
+                    db.session.query(Question.id).filter(Question.id.in_(question_ids)).with_for_update()}
+        Question.query.filter(Question.id.in_(existing)).delete(synchronize_session=False)
+        db.session.commit()
+      except:
+        db.session.rollback()
+        abort(422)
+      finally:
+        db.session.close()
+
+      questions_changed(deleted=existing)
+
+      return jsonify({
+        'success': True,
+        'deleted': sorted(existing),
+        'results': [{'id': question_id, 'status': 'deleted' if question_id in existing else 'not_found'}
+                    for question_id in question_ids]
+      })
+
+    # Endpoint that streams every question as JSON lines, straight from a
+    # server-side cursor.
+    @app.route('/questions/export')
+    def export_all_questions():
+      return app.response_class(
+        stream_with_context(export_questions()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=questions.jsonl'})
+
+    # Endpoint that loads questions in bulk from a JSONL or CSV body (or a
+    # multipart 'file'), inserting them in batches. Invalid rows are skipped
+    # and reported by line number.
+    @app.route('/questions/import', methods=['POST'])
+    def import_all_questions():
+      upload = request.files.get('file')
+      stream = upload.stream if upload else request.stream
+      mimetype = upload.mimetype if upload else request.mimetype
+      format = request.args.get('format') or ('csv' if mimetype == 'text/csv' else 'jsonl')
+      if format not in ('jsonl', 'csv'):
+        abort(400)
+
+      report = import_questions(read_records(text_lines(stream), format), set(categories.formatted()))
+      questions_changed(reload=True)
+
+      return jsonify(dict(report, success=True))
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(['jsonl', 'csv']), help='Defaults to the file extension.')
+    def import_questions_command(path, format):
+      """Load questions from a JSONL or CSV file."""
+      format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+      with open(path, 'rb') as questions_file:
+        report = import_questions(read_records(text_lines(questions_file), format), set(categories.formatted()))
+      questions_changed(reload=True)
+
+      for error in report['errors']:
+        click.echo('line {}: {}'.format(error['line'], error['error']), err=True)
+      click.echo('Imported {} question(s), {} failed, in {}s ({} rows/s)'.format(
+        report['imported'], report['failed'], report['seconds'], report['rows_per_second']))
+
+    @app.cli.command('find-duplicates')
+    @click.option('--threshold', type=float, help='Estimated similarity (0-1) at which two questions count as duplicates.')
+    def find_duplicates_command(threshold):
+      """List clusters of near-duplicate questions."""
+      if threshold is not None:
+        duplicate_index.threshold = threshold
+      clusters = duplicate_index.clusters()
+
+      for cluster in clusters:
+        questions = Question.query.filter(Question.id.in_(cluster)).order_by(Question.id).all()
+        click.echo('{} questions:'.format(len(questions)))
+        for question in questions:
+          click.echo('  {:>6}  {}'.format(question.id, question.question))
+      click.echo('{} cluster(s) of near-duplicate questions'.format(len(clusters)))
+
+    @app.cli.command('export-questions')
+    @click.argument('output', type=click.File('w'), default='-')
+    def export_questions_command(output):
+      """Write every question as JSON lines (to stdout by default)."""
+      for line in export_questions():
+        output.write(line)
+
+    # Endpoint that starts a quiz session: the questions for the category are
+    # shuffled once and kept on the server, so the client only asks for the next one.
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def create_quiz_session():
+      body = request.get_json() or {}
+      quiz_category = body.get('quiz_category') or {'id': 0}
+
+      try:
+        category_id = int(quiz_category['id'])
+      except (KeyError, TypeError, ValueError):
+        abort(400)
+
+      if category_id != 0 and categories.get(category_id) is None:
+        abort(404)
+
+      question_ids = sampler.ids(category_id)
+      session_id = quiz_sessions.create(category_id, question_ids)
+
+      return jsonify({
+        'success': True,
+        'session_id': session_id,
+        'total_questions': len(question_ids)
+      })
+
+    # Endpoint that returns the next question of a quiz session, or null once
+    # every question in the category has been asked.
+    @app.route('/quizzes/sessions/<session_id>/next')
+    def next_quiz_question(session_id):
+      while True:
+        question_id, session = quiz_sessions.pop(session_id)
+        if session is None:
+          abort(404)
+        if question_id is None:
+          current_question = None
+          break
+        # Skip questions deleted since the session started.
+        current_question = Question.query.get(question_id)
+        if current_question is not None:
+          current_question = current_question.format()
+          break
+
+      return jsonify({
+        'success': True,
+        'question': current_question,
+        'questions_asked': session['asked'],
+        'questions_remaining': len(session['remaining'])
+      })
+
+    def deck_response(category_id, questions):
+      deck_id = encode_deck(category_id, [question.id for question in questions])
+      response = jsonify({
+        'success': True,
+        'deck_id': deck_id,
+        'questions': [question.format() for question in questions],
+        'total_questions': len(questions)
+      })
+      response.set_etag(deck_id)
+      response.headers['Location'] = url_for('retrieve_quiz_deck', deck_id=deck_id)
+      return response
+
+    # Endpoint that deals a whole quiz at once: size distinct random questions
+    # for the category (optionally along a difficulty_curve, as for /quizzes),
+    # so the client needs no further requests to play it.
+    @app.route('/quizzes/deck', methods=['POST'])
+    def create_quiz_deck():
+      body = request.get_json(silent=True) or {}
+      quiz_category = body.get('quiz_category') or {'id': 0}
+      previous_questions = body.get('previous_questions') or []
+
+      try:
+        category_id = int(quiz_category['id'])
+        size = int(body.get('size', QUESTIONS_PER_QUIZ))
+        curve = difficulty_curve(body['difficulty_curve'], size) if body.get('difficulty_curve') is not None else None
+      except (KeyError, TypeError, ValueError):
+        abort(400)
+      if not 1 <= size <= MAX_QUIZ_LENGTH:
+        abort(400)
+
+      if category_id != 0 and categories.get(category_id) is None:
+        abort(404)
+
+      difficulties = [curve[min(position, len(curve) - 1)] for position in range(size)] if curve else [None] * size
+      questions = sampler.sample_quiz(category_id, difficulties, previous_questions)
+
+      return deck_response(category_id, questions)
+
+    # Endpoint that returns a deck again from its id, e.g. after the client
+    # reconnects. Questions deleted since the deal are left out (and the deck
+    # id changes accordingly); If-None-Match with the deck id is answered with
+    # 304 without touching the database.
+    @app.route('/quizzes/deck/<deck_id>')
+    def retrieve_quiz_deck(deck_id):
+      if request.if_none_match.contains(deck_id):
+        response = app.response_class(status=304)
+        response.set_etag(deck_id)
+        return response
+
+      try:
+        category_id, question_ids = decode_deck(deck_id)
+      except ValueError:
+        abort(404)
+      if not question_ids or len(question_ids) > MAX_QUIZ_LENGTH:
+        abort(404)
+
+      questions = {question.id: question for question in Question.query.filter(Question.id.in_(question_ids))}
+
+      return deck_response(category_id, [questions[question_id] for question_id in question_ids if question_id in questions])
+
     @app.errorhandler(400)
     def bad_request(error):
       return jsonify({
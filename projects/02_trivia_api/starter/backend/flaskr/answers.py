@@ -0,0 +1,133 @@
+import re
+import threading
+import time
+import unicodedata
+
+from models import db, Question
+
+ARTICLES = {'a', 'an', 'the'}
+
+# Longest guess that is checked at all; edit distance is O(n * m).
+MAX_GUESS_LENGTH = 200
+
+# Words a guess may add to the answer's and still count ("it was Maya
+# Angelou"). Only filler is allowed: any other extra word could be another
+# candidate ("1968 1969") or a negation ("not Brazil").
+MAX_EXTRA_WORDS = 2
+FILLER_WORDS = {'i', 'it', 'its', 'is', 'was', 'that', 'this', 'think', 'guess', 'my', 'answer', 'in', 'of'}
+
+
+def tokens(text):
+  # Lowercase words without accents, punctuation or articles.
+  text = unicodedata.normalize('NFKD', text or '')
+  text = ''.join(character for character in text if not unicodedata.combining(character))
+  return [word for word in re.findall(r'\w+', text.lower()) if word not in ARTICLES]
+
+
+def edit_distance(first, second, limit=None):
+  # Levenshtein distance, also counting a swap of two neighbouring
+  # characters as one edit (optimal string alignment). With limit, stops
+  # and returns limit + 1 once the distance is known to be over it.
+  if limit is not None and abs(len(first) - len(second)) > limit:
+    return limit + 1
+  before, previous = None, list(range(len(second) + 1))
+  for index in range(1, len(first) + 1):
+    current = [index]
+    for other_index in range(1, len(second) + 1):
+      cost = first[index - 1] != second[other_index - 1]
+      distance = min(previous[other_index] + 1, current[-1] + 1, previous[other_index - 1] + cost)
+      if index > 1 and other_index > 1 and first[index - 1] == second[other_index - 2] \
+          and first[index - 2] == second[other_index - 1]:
+        distance = min(distance, before[other_index - 2] + 1)
+      current.append(distance)
+    # No row has a smaller minimum than the one before it.
+    if limit is not None and min(current) > limit:
+      return limit + 1
+    before, previous = previous, current
+  return previous[-1]
+
+
+def ratio(first, second, cutoff=0.0):
+  # 1.0 for equal strings, down to 0.0 when every character differs, or
+  # 0.0 as soon as the ratio is known to be below cutoff.
+  longest = max(len(first), len(second))
+  if not longest:
+    return 1.0
+  limit = int(longest * (1 - cutoff) + 1e-9)
+  distance = edit_distance(first, second, limit)
+  return 1.0 - distance / longest if distance <= limit else 0.0
+
+'''
+AnswerChecker
+    checks quiz answers against Question.answer. Both sides are reduced to
+    their words (see tokens()); a guess is correct when it contains every
+    word of the answer plus at most MAX_EXTRA_WORDS filler words, or when the
+    sorted words of both are at least threshold similar by edit distance,
+    which forgives typos and word order. Similarities below threshold are
+    reported as 0.0, since the distance stops being computed there.
+
+    The reduced forms of every answer are computed once and kept in memory,
+    so a check never reads the database for a known question. Answers of
+    questions created since the last load are read on first use; the whole
+    map is reloaded after ttl seconds, and an empty table is never treated
+    as loaded.
+'''
+class AnswerChecker:
+
+  def __init__(self, threshold=0.85, ttl=300):
+    self.threshold = threshold
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self._loaded_at = None
+    self._answers = {}
+
+  @staticmethod
+  def _forms(answer):
+    words = tokens(answer)
+    return {'answer': answer, 'words': frozenset(words), 'sorted': ' '.join(sorted(words))}
+
+  def load(self, session=None):
+    rows = (session or db.session).query(Question.id, Question.answer).all()
+    answers = {question_id: self._forms(answer) for question_id, answer in rows}
+
+    with self.lock:
+      self._answers = answers
+      self._loaded_at = time.time()
+
+  def stale(self):
+    return self._loaded_at is None or not self._answers or time.time() - self._loaded_at > self.ttl
+
+  def _ensure_loaded(self):
+    if self.stale():
+      self.load()
+
+  def forget(self, question_id):
+    with self.lock:
+      self._answers.pop(question_id, None)
+
+  def check(self, question_id, guess):
+    # Returns {'answer', 'correct', 'similarity'} for the question, or None
+    # if it doesn't exist.
+    self._ensure_loaded()
+    forms = self._answers.get(question_id)
+    if forms is None:
+      row = db.session.query(Question.answer).filter(Question.id == question_id).one_or_none()
+      if row is None:
+        return None
+      forms = self._forms(row.answer)
+      with self.lock:
+        self._answers[question_id] = forms
+
+    words = tokens(guess)
+    extra_words = set(words) - forms['words']
+    if forms['words'] and forms['words'] <= set(words) and \
+        len(extra_words) <= MAX_EXTRA_WORDS and extra_words <= FILLER_WORDS:
+      similarity = 1.0
+    else:
+      similarity = ratio(' '.join(sorted(words)), forms['sorted'], self.threshold)
+
+    return {
+      'answer': forms['answer'],
+      'correct': bool(words) and similarity >= self.threshold,
+      'similarity': round(similarity, 2)
+    }
@@ -0,0 +1,411 @@
+import asyncio
+import contextlib
+import os
+
+from flask import Config
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from models import database_path, Question
+from . import QUESTIONS_PER_PAGE, MAX_QUIZ_LENGTH, load_settings
+from .caches import CategoryCache, QuestionCountCache
+from .duplicates import DuplicateIndex, signature
+from .sampler import QuestionSampler, QUESTIONS_PER_QUIZ, difficulty_curve
+from .search import QuestionSearch
+
+'''
+ASGI variant of the trivia API
+    the categories, questions, search and quiz routes of create_app() on
+    Starlette and SQLAlchemy's asyncio engine, so a worker keeps serving
+    other requests while one waits on the database. Run it with
+
+        uvicorn --factory flaskr.asgi:create_asgi_app
+
+    It shares models.py, the settings (TRIVIA_SETTINGS and TRIVIA_<NAME>)
+    and the in-memory caches with the Flask app. The caches load through
+    the request's AsyncSession (run_sync) before they are read (see
+    fresh()), so they never fall back to the Flask-SQLAlchemy session here.
+
+    The routes it serves answer as the Flask ones do, including 409 for
+    near-duplicate questions, except that:
+      - searches always run against the database; there is no search
+        result cache to fill or invalidate
+      - there is no admission control (429/503), /metrics or /admission
+      - the batch, import/export, answer checking, leaderboard, quiz
+        session, deck and bootstrap endpoints are Flask only
+    Each process has caches of its own, so writes made through one app
+    reach the other's caches when they expire (ttl), as between Flask
+    workers.
+'''
+
+ASYNC_DRIVERS = {
+  'postgres': 'postgresql+asyncpg',
+  'postgresql': 'postgresql+asyncpg',
+  'sqlite': 'sqlite+aiosqlite'
+}
+
+
+def async_database_url(url):
+  # postgresql://... -> postgresql+asyncpg://..., sqlite://... -> sqlite+aiosqlite://...
+  scheme, rest = url.split('://', 1)
+  return '{}://{}'.format(ASYNC_DRIVERS.get(scheme, scheme), rest)
+
+
+def query_int(request, name, default=None):
+  # Like Flask's request.args.get(name, default, type=int).
+  try:
+    return int(request.query_params[name])
+  except (KeyError, ValueError):
+    return default
+
+
+async def get_json(request):
+  # Like Flask's request.get_json(silent=True).
+  try:
+    return await request.json()
+  except ValueError:
+    return None
+
+
+async def paginate_questions(request, session, selection):
+  # Same contract as paginate_questions() in __init__.py, for a select().
+  page = max(query_int(request, 'page', 1), 1)
+  cursor = query_int(request, 'cursor')
+
+  selection = selection.order_by(Question.id)
+  if cursor is not None:
+    selection = selection.where(Question.id > cursor)
+  else:
+    selection = selection.offset((page - 1) * QUESTIONS_PER_PAGE)
+
+  rows = (await session.execute(selection.limit(QUESTIONS_PER_PAGE + 1))).scalars().all()
+  has_more = len(rows) > QUESTIONS_PER_PAGE
+  current_questions = [question.format() for question in rows[:QUESTIONS_PER_PAGE]]
+
+  page_info = {
+    'has_more': has_more,
+    'next_cursor': current_questions[-1]['id'] if has_more else None
+  }
+
+  return current_questions, page_info
+
+
+class Preloaded:
+  # The caches below never load on a read: fresh() loads them first, through
+  # the request's session.
+  def _ensure_loaded(self):
+    pass
+
+
+class AsyncCategoryCache(Preloaded, CategoryCache):
+  pass
+
+
+class AsyncQuestionCountCache(Preloaded, QuestionCountCache):
+  pass
+
+
+class AsyncQuestionSampler(Preloaded, QuestionSampler):
+  pass
+
+
+class AsyncDuplicateIndex(Preloaded, DuplicateIndex):
+  pass
+
+
+def create_asgi_app(test_config=None):
+  config = Config(os.getcwd())
+  load_settings(config)
+  config.update(test_config or {})
+  engine = create_async_engine(async_database_url(config.get('SQLALCHEMY_DATABASE_URI', database_path)),
+                               **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+  Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+  question_counts = AsyncQuestionCountCache()
+  categories = AsyncCategoryCache()
+  sampler = AsyncQuestionSampler()
+  question_search = QuestionSearch()
+  duplicate_index = AsyncDuplicateIndex(config.get('DUPLICATE_THRESHOLD', 0.7))
+
+  loading = asyncio.Lock()
+
+  async def fresh(session, *caches):
+    # Loads any of caches that would otherwise load on their next read, one
+    # load at a time so concurrent requests don't all reload the same cache.
+    for cache in caches:
+      if cache.stale():
+        async with loading:
+          if cache.stale():
+            await session.run_sync(cache.load)
+
+  def questions_changed(added=(), deleted=()):
+    question_counts.invalidate()
+    for question_id, category, difficulty in added:
+      sampler.add(question_id, category, difficulty)
+    for question_id in deleted:
+      sampler.remove(question_id)
+      duplicate_index.remove(question_id)
+
+  async def describe_duplicates(session, duplicates):
+    # As describe_duplicates() in __init__.py.
+    similarities = dict(duplicates)
+    questions = (await session.execute(select(Question).where(Question.id.in_(similarities)))).scalars().all() \
+      if similarities else []
+    return sorted([{'id': question.id, 'question': question.question, 'similarity': round(similarities[question.id], 2)}
+                   for question in questions], key=lambda duplicate: -duplicate['similarity'])
+
+  @contextlib.asynccontextmanager
+  async def lifespan(app):
+    async with engine.begin() as connection:
+      await connection.run_sync(question_search.setup)
+    async with Session() as session:
+      await fresh(session, categories, sampler, duplicate_index)
+    yield
+    await engine.dispose()
+
+  # Endpoint to return all categories. With ?counts=true the response also
+  # includes the number of questions in each category.
+  async def retrieve_categories(request):
+    async with Session() as session:
+      await fresh(session, categories)
+      formatted_categories = categories.formatted()
+
+      if len(formatted_categories) == 0:
+        raise HTTPException(404)
+
+      if request.query_params.get('counts', 'false').lower() != 'true':
+        return Response(categories.response_body(), media_type='application/json')
+
+      await fresh(session, question_counts)
+      counts = question_counts.counts()
+
+    return JSONResponse({
+      'success': True,
+      'categories': formatted_categories,
+      'question_counts': {category_id: counts.get(category_id, 0) for category_id in formatted_categories}
+    })
+
+  # Endpoint to return all questions
+  async def retrieve_questions(request):
+    async with Session() as session:
+      await fresh(session, categories, question_counts)
+      current_questions, page_info = await paginate_questions(request, session, select(Question))
+
+    if len(current_questions) == 0:
+      raise HTTPException(404)
+
+    return JSONResponse({
+      'success': True,
+      'questions': current_questions,
+      'total_questions': question_counts.total(),
+      'categories': categories.formatted(),
+      'current_category': categories.first(),
+      'has_more': page_info['has_more'],
+      'next_cursor': page_info['next_cursor']
+    })
+
+  # Endpoint to delete a question from the database
+  async def delete_questions(request):
+    question_id = request.path_params['question_id']
+    async with Session() as session:
+      question = await session.get(Question, question_id)
+      if question is None:
+        raise HTTPException(422)
+
+      try:
+        await session.delete(question)
+        await session.commit()
+      except Exception:
+        await session.rollback()
+        raise HTTPException(422)
+
+    questions_changed(deleted=[question_id])
+
+    return JSONResponse({
+      'success': True,
+      'deleted': question_id
+    })
+
+  # Endpoint that creates a new question, or searches the questions when the
+  # body has a searchTerm.
+  async def create_question(request):
+    body = await get_json(request) or {}
+    search_term = body.get('searchTerm')
+
+    async with Session() as session:
+      await fresh(session, categories)
+
+      if search_term:
+        page = max(query_int(request, 'page', 1), 1)
+        current_questions, total_questions, has_more = await session.run_sync(
+          lambda sync_session: question_search.search(search_term, page, QUESTIONS_PER_PAGE, sync_session))
+
+        return JSONResponse({
+          'success': True,
+          'questions': current_questions,
+          'total_questions': total_questions,
+          'current_category': categories.first(),
+          'has_more': has_more,
+          'next_cursor': None
+        })
+
+      await fresh(session, duplicate_index)
+      question_signature = signature(body.get('question'))
+      duplicates = duplicate_index.find(body.get('question'), question_signature) if body.get('question') else []
+      described = await describe_duplicates(session, duplicates)
+      if duplicates and config.get('DUPLICATE_QUESTIONS', 'reject') == 'reject' and not body.get('allow_duplicate'):
+        return JSONResponse({
+          "success": False,
+          "error": 409,
+          "message": "duplicate question",
+          "duplicates": described
+          }, status_code=409)
+
+      try:
+        new_question = Question(question=body.get('question'), answer=body.get('answer'),
+                                category=body.get('category'), difficulty=body.get('difficulty'))
+        session.add(new_question)
+        await session.commit()
+      except Exception:
+        await session.rollback()
+        raise HTTPException(422)
+
+    questions_changed(added=[(new_question.id, new_question.category, new_question.difficulty)])
+    duplicate_index.add(new_question.id, question_signature)
+
+    return JSONResponse({
+      'success': True,
+      'question_id': new_question.id,
+      'duplicates': described
+    })
+
+  # Endpoint to return questions in a specified category
+  async def retrieve_questions_by_category(request):
+    category_id = request.path_params['category_id']
+    async with Session() as session:
+      await fresh(session, categories, question_counts)
+      total_questions = question_counts.for_category(category_id)
+      if total_questions == 0:
+        raise HTTPException(404)
+
+      selection = select(Question).where(Question.category == category_id)
+      current_questions, page_info = await paginate_questions(request, session, selection)
+
+    return JSONResponse({
+      'success': True,
+      'questions': current_questions,
+      'total_questions': total_questions,
+      'current_category': categories.get(category_id),
+      'has_more': page_info['has_more'],
+      'next_cursor': page_info['next_cursor']
+    })
+
+  # Endpoint that provides the next question of a quiz (or, with quiz_length,
+  # the rest of the quiz), as POST /quizzes in __init__.py.
+  async def create_quiz(request):
+    body = await get_json(request) or {}
+    previous_questions = body.get('previous_questions', None) or []
+    quiz_category = body.get('quiz_category', None) or {'id': 0}
+
+    try:
+      category_id = int(quiz_category['id'])
+      quiz_length = int(body['quiz_length']) if body.get('quiz_length') is not None else None
+      curve = None
+      if body.get('difficulty_curve') is not None:
+        curve_length = len(previous_questions) + quiz_length if quiz_length else QUESTIONS_PER_QUIZ
+        curve = difficulty_curve(body['difficulty_curve'], curve_length)
+    except (KeyError, TypeError, ValueError):
+      raise HTTPException(400)
+    if quiz_length is not None and not 1 <= quiz_length <= MAX_QUIZ_LENGTH:
+      raise HTTPException(400)
+
+    def target_difficulty(position):
+      return curve[min(position, len(curve) - 1)] if curve else None
+
+    async with Session() as session:
+      await fresh(session, categories, sampler)
+      if category_id != 0 and categories.get(category_id) is None:
+        raise HTTPException(404)
+
+      if quiz_length is not None:
+        positions = range(len(previous_questions), len(previous_questions) + quiz_length)
+        question_ids = sampler.pick_quiz(category_id, [target_difficulty(position) for position in positions],
+                                         previous_questions)
+        rows = (await session.execute(select(Question).where(Question.id.in_(question_ids)))).scalars().all() \
+          if question_ids else []
+        questions = {question.id: question for question in rows}
+        for question_id in question_ids:
+          if question_id not in questions:
+            sampler.remove(question_id)
+
+        return JSONResponse({
+          'success': True,
+          'questions': [questions[question_id].format() for question_id in question_ids if question_id in questions]
+        })
+
+      exclude = set(previous_questions)
+      current_question = None
+      while True:
+        question_id = sampler.sample_nearest(category_id, exclude, target_difficulty(len(previous_questions)))
+        if question_id is None:
+          break
+        current_question = await session.get(Question, question_id)
+        if current_question is not None:
+          current_question = current_question.format()
+          break
+        sampler.remove(question_id)
+        exclude.add(question_id)
+
+    return JSONResponse({
+      'success': True,
+      'question': current_question
+    })
+
+  async def bad_request(request, error):
+    return JSONResponse({
+      "success": False,
+      "error": 400,
+      "message": "bad request"
+      }, status_code=400)
+
+  async def not_found(request, error):
+    return JSONResponse({
+      "success": False,
+      "error": 404,
+      "message": "resource not found"
+      }, status_code=404)
+
+  async def unprocessable(request, error):
+    return JSONResponse({
+      "success": False,
+      "error": 422,
+      "message": "unprocessable"
+      }, status_code=422)
+
+  # CORS Headers
+  async def after_request(request, call_next):
+    response = await call_next(request)
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization,true'
+    response.headers['Access-Control-Allow-Methods'] = 'GET,PUT,POST,DELETE,OPTIONS'
+    return response
+
+  return Starlette(
+    debug=config.get('DEBUG', False),
+    routes=[
+      Route('/categories', retrieve_categories),
+      Route('/questions', retrieve_questions),
+      Route('/questions', create_question, methods=['POST']),
+      Route('/questions/{question_id:int}', delete_questions, methods=['DELETE']),
+      Route('/categories/{category_id:int}/questions', retrieve_questions_by_category),
+      Route('/quizzes', create_quiz, methods=['POST'])
+    ],
+    exception_handlers={400: bad_request, 404: not_found, 422: unprocessable},
+    middleware=[Middleware(BaseHTTPMiddleware, dispatch=after_request)],
+    lifespan=lifespan)
@@ -0,0 +1,123 @@
+import csv
+import io
+import json
+import time
+
+from models import db, Question
+
+BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FIELDS = ['question', 'answer', 'difficulty', 'category']
+
+
+def export_questions():
+  '''
+  Yields every question as one line of JSON, in id order. Rows come from a
+  server-side cursor in chunks of EXPORT_CHUNK_SIZE, so memory use does not
+  grow with the table.
+  '''
+  rows = db.session.query(Question.id, Question.question, Question.answer, Question.difficulty, Question.category) \
+    .order_by(Question.id) \
+    .execution_options(stream_results=True) \
+    .yield_per(EXPORT_CHUNK_SIZE)
+
+  for row in rows:
+    yield json.dumps({
+      'id': row.id,
+      'question': row.question,
+      'answer': row.answer,
+      'difficulty': row.difficulty,
+      'category': row.category
+    }) + '\n'
+
+
+def read_records(lines, format='jsonl'):
+  '''
+  Yields (line number, record or None, error or None) for each non-blank
+  line of a JSONL or CSV (with a header row) stream of text lines.
+  '''
+  if format == 'csv':
+    reader = csv.DictReader(lines)
+    for record in reader:
+      yield reader.line_num, record, None
+    return
+
+  for number, line in enumerate(lines, start=1):
+    if not line.strip():
+      continue
+    try:
+      record = json.loads(line)
+    except ValueError as error:
+      yield number, None, 'invalid JSON: {}'.format(error)
+      continue
+    if not isinstance(record, dict):
+      yield number, None, 'expected a JSON object'
+      continue
+    yield number, record, None
+
+
+def validate(record, category_ids):
+  # Returns (row to insert, None) or (None, error message).
+  row = {}
+  for field in ('question', 'answer'):
+    value = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+      return None, '{} is required'.format(field)
+    row[field] = value.strip()
+
+  try:
+    row['difficulty'] = int(record.get('difficulty'))
+    row['category'] = int(record.get('category'))
+  except (TypeError, ValueError):
+    return None, 'difficulty and category must be integers'
+
+  if not 1 <= row['difficulty'] <= 5:
+    return None, 'difficulty must be between 1 and 5'
+  if row['category'] not in category_ids:
+    return None, 'unknown category {}'.format(row['category'])
+  return row, None
+
+
+def import_questions(records, category_ids, batch_size=BATCH_SIZE):
+  '''
+  Inserts valid records from read_records() with one multi-row INSERT and
+  commit per batch_size rows; invalid rows are skipped and reported by line.
+  Returns a report with counts, the first errors and the throughput.
+  '''
+  start = time.perf_counter()
+  report = {'imported': 0, 'failed': 0, 'errors': []}
+  batch = []
+
+  def flush():
+    if batch:
+      db.session.execute(Question.__table__.insert(), batch)
+      db.session.commit()
+      report['imported'] += len(batch)
+      del batch[:]
+
+  try:
+    for number, record, error in records:
+      if error is None:
+        row, error = validate(record, category_ids)
+      if error is not None:
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+          report['errors'].append({'line': number, 'error': error})
+        continue
+      batch.append(row)
+      if len(batch) >= batch_size:
+        flush()
+    flush()
+  except Exception:
+    db.session.rollback()
+    raise
+
+  report['seconds'] = round(time.perf_counter() - start, 3)
+  report['rows_per_second'] = round(report['imported'] / report['seconds']) if report['seconds'] else report['imported']
+  return report
+
+
+def text_lines(stream, encoding='utf-8'):
+  # Wraps a binary stream (request body, opened file) as text lines.
+  return io.TextIOWrapper(stream, encoding=encoding, newline='')
@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.sql.expression import func
+
+from models import db, Question, Category
+
+'''
+CategoryCache
+    the categories table, which almost never changes, held in process with
+    the formatted {id: type} map and the /categories response body
+    serialized once per load. Reloaded after ttl seconds or invalidate().
+
+    Like the other caches here, load() takes an optional session (the
+    Flask-SQLAlchemy one by default) and stale() says whether the next
+    read would load, so the async app can load through its own session
+    first (see asgi.py).
+'''
+class CategoryCache:
+
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.invalidate()
+
+  def invalidate(self):
+    with self.lock:
+      self._loaded_at = None
+
+  def load(self, session=None):
+    categories = (session or db.session).query(Category).order_by(Category.id).all()
+    formatted = {category.id: category.type for category in categories}
+    body = json.dumps({'categories': formatted, 'success': True}, sort_keys=True)
+
+    with self.lock:
+      self._formatted = formatted
+      self._first = categories[0].format() if categories else None
+      self._body = body
+      self._loaded_at = time.time()
+
+  def stale(self):
+    # An empty table is re-read on every call rather than cached, so a
+    # database that is seeded after startup is picked up straight away.
+    return self._loaded_at is None or not self._formatted or time.time() - self._loaded_at > self.ttl
+
+  def _ensure_loaded(self):
+    if self.stale():
+      self.load()
+
+  def formatted(self):
+    self._ensure_loaded()
+    return self._formatted
+
+  def response_body(self):
+    # JSON for GET /categories, ready to send as is.
+    self._ensure_loaded()
+    return self._body
+
+  def first(self):
+    # {id: type} for the lowest category id, or None if there are none.
+    self._ensure_loaded()
+    return {self._first['id']: self._first['type']} if self._first else None
+
+  def get(self, category_id):
+    # {id: type} for category_id, or None if it doesn't exist.
+    formatted = self.formatted()
+    try:
+      category_id = int(category_id)
+    except (TypeError, ValueError):
+      return None
+    if category_id not in formatted:
+      return None
+    return {category_id: formatted[category_id]}
+
+'''
+QuestionCountCache
+    question totals per category, loaded with a single GROUP BY query and
+    kept until a question is inserted or deleted (invalidate()) or the ttl
+    runs out, so listing endpoints never count the table themselves.
+    The ttl bounds how stale counts can be in other worker processes.
+'''
+class QuestionCountCache:
+
+  def __init__(self, ttl=60):
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.invalidate()
+
+  def invalidate(self):
+    with self.lock:
+      self._counts = None
+      self._loaded_at = 0
+
+  def stale(self):
+    return self._counts is None or time.time() - self._loaded_at > self.ttl
+
+  def _read(self, session):
+    rows = session.query(Question.category, func.count(Question.id)) \
+      .group_by(Question.category).all()
+    counts = {int(category): count for category, count in rows if category is not None}
+    return counts, sum(count for category, count in rows)
+
+  def load(self, session=None):
+    # The query runs outside the lock: under the async app it yields to the
+    # event loop, and another request on the same thread may take the lock.
+    counts, total = self._read(session or db.session)
+    with self.lock:
+      self._counts, self._total, self._loaded_at = counts, total, time.time()
+
+  def _ensure_loaded(self):
+    # Threads of the Flask app wait here for one of them to load.
+    with self.lock:
+      if self.stale():
+        self._counts, self._total = self._read(db.session)
+        self._loaded_at = time.time()
+
+  def counts(self):
+    self._ensure_loaded()
+    return self._counts
+
+  def total(self):
+    self.counts()
+    return self._total
+
+  def for_category(self, category_id):
+    return self.counts().get(int(category_id), 0)
+
+'''
+SearchResultCache
+    results of full-text searches keyed on the normalized term and page,
+    bounded to max_entries with least recently used eviction and expired
+    after ttl seconds. invalidate() drops everything and is called on every
+    question insert or delete, so a cached page is never older than the
+    last write made in this process. A search that was running when
+    invalidate() was called may have read the old rows, so put() drops
+    results computed in an earlier generation.
+'''
+class SearchResultCache:
+
+  def __init__(self, max_entries=1000, ttl=60):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self._entries = OrderedDict()
+    self.generation = 0
+    self.hits = 0
+    self.misses = 0
+
+  @staticmethod
+  def key(term, page):
+    return ' '.join(term.lower().split()), page
+
+  def get(self, term, page):
+    # The cached result for term and page, or None.
+    key = self.key(term, page)
+    with self.lock:
+      entry = self._entries.get(key)
+      if entry is None or time.time() - entry[0] > self.ttl:
+        self._entries.pop(key, None)
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[1]
+
+  def put(self, term, page, result, generation):
+    # generation is self.generation as read before the search ran.
+    with self.lock:
+      if generation != self.generation:
+        return
+      self._entries[self.key(term, page)] = (time.time(), result)
+      self._entries.move_to_end(self.key(term, page))
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def invalidate(self):
+    with self.lock:
+      self._entries.clear()
+      self.generation += 1
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return {
+      'entries': len(self._entries),
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+    }
+
+'''
+ResponseCache
+    a JSON response assembled from the other caches, kept serialized and
+    gzip-compressed (with an ETag) until invalidate() or ttl, so it is
+    served without rebuilding or recompressing. build() returns the body
+    as a dict.
+'''
+class ResponseCache:
+
+  def __init__(self, build, ttl=60):
+    self.build = build
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.invalidate()
+
+  def invalidate(self):
+    with self.lock:
+      self._response = None
+      self._built_at = 0
+
+  def get(self):
+    # (body, gzipped body, etag)
+    with self.lock:
+      if self._response is None or time.time() - self._built_at > self.ttl:
+        body = json.dumps(self.build(), sort_keys=True).encode('utf-8')
+        self._response = (body, gzip.compress(body), hashlib.sha1(body).hexdigest())
+        self._built_at = time.time()
+      return self._response
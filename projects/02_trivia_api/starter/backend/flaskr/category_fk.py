@@ -0,0 +1,117 @@
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+from models import db
+
+BATCH_SIZE = 5000
+
+'''
+upgrade_question_category()
+    turns questions.category into an indexed integer foreign key on
+    categories.id without long locks, so other clients of the table can
+    keep writing while it runs. The API itself must be upgraded after it:
+    the Question model expects an integer column. Every step checks the
+    current schema first, so it is safe to re-run after an interruption:
+
+      1. if category is still text: add an integer category_id column and a
+         trigger that fills it on writes, backfill it in committed batches,
+         then swap the columns in one short transaction
+      2. CREATE INDEX CONCURRENTLY on category, dropping an invalid index
+         left behind by an interrupted build first
+      3. add the foreign key NOT VALID (no table scan under lock), clear
+         categories that point nowhere, then VALIDATE it
+'''
+def upgrade_question_category(batch_size=BATCH_SIZE, echo=print):
+  engine = db.engine
+  if engine.dialect.name != 'postgresql':
+    raise click.ClickException('upgrade-question-category only supports PostgreSQL')
+
+  column = next(column for column in inspect(engine).get_columns('questions') if column['name'] == 'category')
+  if column['type'].python_type is not int:
+    convert_category_column(engine, batch_size, echo)
+  else:
+    echo('questions.category is already an integer')
+
+  with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+    # IF NOT EXISTS would keep an index that an interrupted CONCURRENTLY
+    # build left INVALID; the planner never uses it, so build it again.
+    valid = connection.execute(text(
+      'SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+      "WHERE pg_class.relname = 'ix_questions_category'")).scalar()
+    if valid is False:
+      echo('dropping invalid index ix_questions_category')
+      connection.execute(text('DROP INDEX CONCURRENTLY ix_questions_category'))
+    echo('indexing questions.category')
+    connection.execute(text('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_category ON questions (category)'))
+
+  foreign_keys = inspect(engine).get_foreign_keys('questions')
+  if not any(key['constrained_columns'] == ['category'] for key in foreign_keys):
+    with engine.begin() as connection:
+      connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+      connection.execute(text(
+        'ALTER TABLE questions ADD CONSTRAINT questions_category_fkey FOREIGN KEY (category) '
+        'REFERENCES categories (id) ON UPDATE CASCADE ON DELETE SET NULL NOT VALID'))
+    with engine.begin() as connection:
+      orphans = connection.execute(text(
+        'UPDATE questions SET category = NULL WHERE category IS NOT NULL '
+        'AND NOT EXISTS (SELECT 1 FROM categories WHERE categories.id = questions.category)')).rowcount
+      if orphans:
+        echo('cleared {} question(s) with an unknown category'.format(orphans))
+    with engine.begin() as connection:
+      echo('validating questions_category_fkey')
+      connection.execute(text('ALTER TABLE questions VALIDATE CONSTRAINT questions_category_fkey'))
+  else:
+    echo('questions.category already has a foreign key')
+
+
+def convert_category_column(engine, batch_size, echo):
+  with engine.begin() as connection:
+    connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+    connection.execute(text('ALTER TABLE questions ADD COLUMN IF NOT EXISTS category_id integer'))
+    # Rows written while the backfill runs are converted by the trigger.
+    connection.execute(text('''
+      CREATE OR REPLACE FUNCTION questions_category_id_sync() RETURNS trigger AS $$
+      BEGIN
+        NEW.category_id := CASE WHEN NEW.category ~ '^\\s*\\d+\\s*$' THEN trim(NEW.category)::integer END;
+        RETURN NEW;
+      END
+      $$ LANGUAGE plpgsql'''))
+    connection.execute(text('DROP TRIGGER IF EXISTS questions_category_id_sync ON questions'))
+    connection.execute(text(
+      'CREATE TRIGGER questions_category_id_sync BEFORE INSERT OR UPDATE OF category ON questions '
+      'FOR EACH ROW EXECUTE PROCEDURE questions_category_id_sync()'))
+
+  with engine.connect() as connection:
+    last_id = connection.execute(text('SELECT coalesce(max(id), 0) FROM questions')).scalar()
+
+  # Short committed batches keep row locks brief for concurrent writers.
+  start = time.perf_counter()
+  for low in range(0, last_id, batch_size):
+    with engine.begin() as connection:
+      connection.execute(text('''
+        UPDATE questions
+        SET category_id = CASE WHEN category ~ '^\\s*\\d+\\s*$' THEN trim(category)::integer END
+        WHERE id > :low AND id <= :high'''), {'low': low, 'high': low + batch_size})
+    echo('backfilled ids up to {} ({:.1f}s)'.format(min(low + batch_size, last_id), time.perf_counter() - start))
+
+  with engine.begin() as connection:
+    connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+    connection.execute(text('DROP TRIGGER questions_category_id_sync ON questions'))
+    connection.execute(text('DROP FUNCTION questions_category_id_sync()'))
+    connection.execute(text('ALTER TABLE questions DROP COLUMN category'))
+    connection.execute(text('ALTER TABLE questions RENAME COLUMN category_id TO category'))
+  echo('questions.category is now an integer')
+
+
+@click.command('upgrade-question-category')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows per backfill transaction.')
+@with_appcontext
+def upgrade_question_category_command(batch_size):
+  """Convert questions.category to an indexed integer foreign key.
+
+  Run with TRIVIA_WARM_UP=0, before deploying the code that expects it.
+  """
+  upgrade_question_category(batch_size, echo=click.echo)
@@ -0,0 +1,23 @@
+import base64
+
+'''
+Quiz decks
+    a deck is a whole quiz drawn in one request. Its id encodes the
+    category and the question ids in order, so any process can serve the
+    same deck again from the id alone (nothing is stored on the server)
+    and the id doubles as the deck's ETag.
+'''
+
+def encode_deck(category, question_ids):
+  text = '.'.join(str(value) for value in [category] + list(question_ids))
+  return base64.urlsafe_b64encode(text.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_deck(deck_id):
+  # Returns (category, question ids); raises ValueError for a malformed id.
+  try:
+    text = base64.urlsafe_b64decode(deck_id + '=' * (-len(deck_id) % 4)).decode('ascii')
+  except (ValueError, UnicodeDecodeError):
+    raise ValueError('malformed deck id')
+  category, *question_ids = [int(value) for value in text.split('.')]
+  return category, question_ids
@@ -0,0 +1,197 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from flask import current_app
+
+from models import db, Question
+
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = (1 << 31) - 1
+
+_permutations = np.random.RandomState(1).randint(1, MERSENNE_PRIME, size=(2, NUM_PERMUTATIONS)).astype(np.uint64)
+
+
+def normalize(text):
+  # Lowercase words separated by single spaces, without punctuation.
+  return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def signature(text):
+  # The MinHash signature of the character shingles of the normalized text.
+  text = normalize(text)
+  shingles = {text[start:start + SHINGLE_SIZE] for start in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+  hashes = np.array([zlib.crc32(shingle.encode('utf-8')) & MERSENNE_PRIME for shingle in shingles], dtype=np.uint64)
+  a, b = _permutations
+  return ((np.outer(hashes, a) + b) % MERSENNE_PRIME).min(axis=0).astype(np.uint32)
+
+
+def similarity(first, second):
+  # Estimated Jaccard similarity of the shingle sets behind two signatures.
+  return float(np.count_nonzero(first == second)) / NUM_PERMUTATIONS
+
+'''
+DuplicateIndex
+    MinHash signatures of every question, with an LSH table over them
+    (BANDS bands of ROWS rows), so near-duplicates of a new question are
+    found by a few dict lookups instead of comparing against the whole
+    table. Candidates from the LSH table are confirmed by their estimated
+    similarity, which must reach threshold.
+
+    add() and remove() keep the index current for writes made in this
+    process, and it is reloaded after ttl seconds to pick up the writes of
+    other processes. Building it takes seconds for a large bank, so only the
+    first load (or the load after an empty table) happens on the request
+    thread: past ttl the current index keeps serving while a background
+    thread builds the new one, and the writes made meanwhile are replayed
+    onto it before it is swapped in.
+'''
+class DuplicateIndex:
+
+  def __init__(self, threshold=0.7, ttl=300):
+    self.threshold = threshold
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self._loaded_at = None
+    self._signatures = {}
+    self._bands = [{} for _ in range(BANDS)]
+    # One list per load in progress, of the add()/remove() calls made since
+    # it started reading the table.
+    self._journals = []
+    self._refreshing = False
+
+  def load(self, session=None):
+    journal = []
+    with self.lock:
+      self._journals.append(journal)
+
+    try:
+      rows = (session or db.session).query(Question.id, Question.question).all()
+      signatures, bands = {}, [{} for _ in range(BANDS)]
+      for question_id, text in rows:
+        self._add(signatures, bands, question_id, signature(text))
+
+      with self.lock:
+        for question_id, question_signature in journal:
+          if question_signature is None:
+            self._remove(signatures, bands, question_id)
+          else:
+            self._add(signatures, bands, question_id, question_signature)
+        self._signatures, self._bands = signatures, bands
+        self._loaded_at = time.time()
+    finally:
+      with self.lock:
+        self._journals.remove(journal)
+
+  def loaded(self):
+    return self._loaded_at is not None and bool(self._signatures)
+
+  def stale(self):
+    return not self.loaded() or time.time() - self._loaded_at > self.ttl
+
+  def _ensure_loaded(self):
+    if not self.loaded():
+      self.load()
+    elif self.stale():
+      self._refresh()
+
+  def _refresh(self):
+    # Reloads on a background thread, one at a time; a failed reload is
+    # retried by the next read.
+    with self.lock:
+      if self._refreshing:
+        return
+      self._refreshing = True
+    app = current_app._get_current_object()
+
+    def run():
+      with app.app_context():
+        try:
+          self.load()
+        except Exception:
+          app.logger.exception('Could not reload the duplicate index')
+        finally:
+          self._refreshing = False
+          db.session.remove()
+
+    threading.Thread(target=run, name='duplicate-index', daemon=True).start()
+
+  def _band_keys(self, question_signature):
+    return [question_signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+  def _add(self, signatures, bands, question_id, question_signature):
+    signatures[question_id] = question_signature
+    for band, key in zip(bands, self._band_keys(question_signature)):
+      band.setdefault(key, set()).add(question_id)
+
+  def _remove(self, signatures, bands, question_id):
+    question_signature = signatures.pop(question_id, None)
+    if question_signature is None:
+      return
+    for band, key in zip(bands, self._band_keys(question_signature)):
+      ids = band.get(key)
+      if ids is not None:
+        ids.discard(question_id)
+        if not ids:
+          del band[key]
+
+  def add(self, question_id, question_signature):
+    # question_signature is the one find() was given or returned for the text.
+    with self.lock:
+      for journal in self._journals:
+        journal.append((question_id, question_signature))
+      if self.loaded():
+        self._add(self._signatures, self._bands, question_id, question_signature)
+
+  def remove(self, question_id):
+    with self.lock:
+      for journal in self._journals:
+        journal.append((question_id, None))
+      if self.loaded():
+        self._remove(self._signatures, self._bands, question_id)
+
+  def find(self, text, question_signature=None):
+    # Returns [(question id, similarity)] for the indexed questions at least
+    # threshold similar to text, most similar first.
+    self._ensure_loaded()
+    if question_signature is None:
+      question_signature = signature(text)
+
+    with self.lock:
+      candidates = set()
+      for band, key in zip(self._bands, self._band_keys(question_signature)):
+        candidates.update(band.get(key, ()))
+      matches = [(question_id, similarity(question_signature, self._signatures[question_id]))
+                 for question_id in candidates]
+    return sorted([match for match in matches if match[1] >= self.threshold], key=lambda match: (-match[1], match[0]))
+
+  def clusters(self):
+    # Groups of two or more questions linked by near-duplicate pairs, each
+    # sorted by id, largest groups first.
+    self._ensure_loaded()
+    with self.lock:
+      parents = {}
+
+      def root(question_id):
+        while parents.get(question_id, question_id) != question_id:
+          question_id = parents[question_id]
+        return question_id
+
+      for band in self._bands:
+        for ids in band.values():
+          ids = sorted(ids)
+          for first in ids:
+            for second in ids:
+              if first < second and root(first) != root(second) and \
+                  similarity(self._signatures[first], self._signatures[second]) >= self.threshold:
+                parents[root(second)] = root(first)
+
+      groups = {}
+      for question_id in parents:
+        groups.setdefault(root(question_id), set()).update([question_id, root(question_id)])
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+'''
+RateLimiter
+    a token bucket per client: each client may make burst requests at once
+    and rate requests per second after that. take() spends a token and
+    returns 0, or returns the seconds until the next token if the bucket is
+    empty.
+
+    Buckets live in this process only and are bounded by max_clients; the
+    least recently seen client is dropped first, which costs it nothing
+    since a new bucket starts full.
+'''
+class RateLimiter:
+
+  def __init__(self, rate=20, burst=40, max_clients=10000):
+    self.rate = rate
+    self.burst = burst
+    self.max_clients = max_clients
+    self.lock = threading.Lock()
+    self._buckets = OrderedDict()
+    self.allowed = 0
+    self.rejected = 0
+
+  def take(self, client):
+    now = time.monotonic()
+    with self.lock:
+      tokens, updated = self._buckets.pop(client, (self.burst, now))
+      tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+      if tokens >= 1:
+        tokens -= 1
+        retry_after = 0
+        self.allowed += 1
+      else:
+        retry_after = (1 - tokens) / self.rate
+        self.rejected += 1
+
+      self._buckets[client] = (tokens, now)
+      if len(self._buckets) > self.max_clients:
+        self._buckets.popitem(last=False)
+    return retry_after
+
+  def stats(self):
+    return {
+      'rate': self.rate,
+      'burst': self.burst,
+      'clients': len(self._buckets),
+      'allowed': self.allowed,
+      'rejected': self.rejected
+    }
+
+'''
+ConcurrencyLimiter
+    caps the number of requests in flight in this process. acquire() never
+    waits: past max_in_flight it returns False and the request is turned
+    away, instead of queueing for a database connection behind everyone
+    else.
+'''
+class ConcurrencyLimiter:
+
+  def __init__(self, max_in_flight=15):
+    self.max_in_flight = max_in_flight
+    self.lock = threading.Lock()
+    self.in_flight = 0
+    self.peak = 0
+    self.rejected = 0
+
+  def acquire(self):
+    with self.lock:
+      if self.in_flight >= self.max_in_flight:
+        self.rejected += 1
+        return False
+      self.in_flight += 1
+      self.peak = max(self.peak, self.in_flight)
+      return True
+
+  def release(self):
+    with self.lock:
+      self.in_flight -= 1
+
+  def stats(self):
+    return {
+      'max_in_flight': self.max_in_flight,
+      'in_flight': self.in_flight,
+      'peak': self.peak,
+      'rejected': self.rejected
+    }
+
+
+def pool_capacity(engine, default=15):
+  # Connections the engine's pool hands out before callers start waiting
+  # (pool_size + max_overflow), or default for pools without a limit.
+  try:
+    return engine.pool.size() + max(engine.pool._max_overflow, 0)
+  except (AttributeError, TypeError):
+    return default
@@ -0,0 +1,141 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+'''
+Metrics
+    request latency histograms, status code counts, database time and
+    in-flight requests per route, rendered in the Prometheus text format.
+
+    Recording takes no lock: every thread writes to a shard of its own
+    (a request is served by one thread from start to finish), and render()
+    adds the shards up. When a thread ends its shard is added to a retired
+    total and dropped, so servers that start a thread per request don't
+    pile up shards, and counters never go backwards.
+'''
+class Metrics:
+
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    self.buckets = buckets
+    self.lock = threading.Lock()
+    self._local = threading.local()
+    self._shards = {}
+    self._retired = {'latency': {}, 'db': {}, 'statuses': {}}
+
+  def _shard(self):
+    shard = getattr(self._local, 'shard', None)
+    if shard is None:
+      shard = {'latency': {}, 'db': {}, 'statuses': {}, 'in_flight': 0, 'db_time': 0.0}
+      # The thread's locals are cleared when it ends, which runs _retire.
+      owner = ShardOwner()
+      self._local.owner, self._local.shard = owner, shard
+      with self.lock:
+        self._shards[id(shard)] = shard
+      weakref.finalize(owner, self._retire, shard)
+    return shard
+
+  def _retire(self, shard):
+    with self.lock:
+      del self._shards[id(shard)]
+      add_counts(self._retired, shard)
+
+  def start_request(self):
+    shard = self._shard()
+    shard['in_flight'] += 1
+    shard['db_time'] = 0.0
+    return time.perf_counter()
+
+  def add_db_time(self, seconds):
+    # Called for every statement; counts towards the request running on
+    # this thread, if any.
+    self._shard()['db_time'] += seconds
+
+  def finish_request(self, route, method, status, started):
+    shard = self._shard()
+    self._observe(shard['latency'], (route, method), time.perf_counter() - started)
+    self._observe(shard['db'], (route, method), shard['db_time'])
+    key = (route, method, status)
+    shard['statuses'][key] = shard['statuses'].get(key, 0) + 1
+
+  def end_request(self):
+    self._shard()['in_flight'] -= 1
+
+  def _observe(self, histograms, key, seconds):
+    histogram = histograms.get(key)
+    if histogram is None:
+      # One count per bucket, then +Inf, then the sum of observations.
+      histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+    histogram[bisect_left(self.buckets, seconds)] += 1
+    histogram[-1] += seconds
+
+  def _merged(self):
+    merged = {'latency': {}, 'db': {}, 'statuses': {}}
+    with self.lock:
+      add_counts(merged, self._retired)
+      shards = list(self._shards.values())
+    for shard in shards:
+      add_counts(merged, shard)
+    return merged
+
+  def in_flight(self):
+    with self.lock:
+      shards = list(self._shards.values())
+    return sum(shard['in_flight'] for shard in shards)
+
+  def render(self, gauges=()):
+    # The metrics as Prometheus text (version 0.0.4). gauges is extra
+    # (name, type, help, value) samples to append without labels.
+    lines = []
+    merged = self._merged()
+    for name, help_text, histograms in (
+        ('trivia_request_duration_seconds', 'Time to serve a request.', merged['latency']),
+        ('trivia_request_db_seconds', 'Time spent in database statements per request.', merged['db'])):
+      lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} histogram'.format(name)]
+      for (route, method), histogram in sorted(histograms.items()):
+        labels = 'route="{}",method="{}"'.format(escape(route), method)
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), histogram[:-1]):
+          cumulative += count
+          lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, histogram[-1]))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, cumulative))
+
+    lines += ['# HELP trivia_requests_total Requests served, by status code.', '# TYPE trivia_requests_total counter']
+    for (route, method, status), count in sorted(merged['statuses'].items()):
+      lines.append('trivia_requests_total{{route="{}",method="{}",status="{}"}} {}'.format(
+        escape(route), method, status, count))
+
+    lines += ['# HELP trivia_requests_in_flight Requests being served.', '# TYPE trivia_requests_in_flight gauge',
+              'trivia_requests_in_flight {}'.format(self.in_flight())]
+
+    for name, type, help_text, value in gauges:
+      lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, type), '{} {}'.format(name, value)]
+
+    return '\n'.join(lines) + '\n'
+
+
+class ShardOwner:
+  # Stands in for a thread in Metrics._local; shards can't be weakly
+  # referenced themselves.
+  pass
+
+
+def add_counts(target, shard):
+  # Adds the histograms and status counts of shard to target.
+  for name in ('latency', 'db', 'statuses'):
+    totals = target[name]
+    for key, value in list(shard[name].items()):
+      if isinstance(value, list):
+        total = totals.setdefault(key, [0] * len(value))
+        for index, count in enumerate(value):
+          total[index] += count
+      else:
+        totals[key] = totals.get(key, 0) + value
+
+
+def escape(value):
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
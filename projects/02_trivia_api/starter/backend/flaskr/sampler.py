@@ -0,0 +1,208 @@
+import random
+import threading
+import time
+
+from models import db, Question
+
+ALL_CATEGORIES = 0
+DIFFICULTIES = range(1, 6)
+QUESTIONS_PER_QUIZ = 10
+
+'''
+QuestionSampler
+    question ids per category (plus ALL_CATEGORIES) held in memory, so a
+    quiz can draw its next question without ORDER BY random() or a growing
+    NOT IN filter. Draws are uniform over the ids not yet asked:
+    random picks are retried while they hit an excluded id, which takes
+    O(1) expected tries while fewer than half of the category's questions
+    have been asked; past that the remaining ids are listed once instead.
+
+    Each category is also split into (category, difficulty) buckets, so a
+    quiz can follow a difficulty curve: every position of the curve is
+    drawn from the nearest difficulty that still has questions left, and
+    the whole quiz is then fetched with one query.
+
+    add() and remove() keep the ids current for writes made in this
+    process; the whole map is reloaded after ttl seconds to pick up writes
+    made in other processes.
+'''
+class QuestionSampler:
+
+  def __init__(self, ttl=300, rng=None):
+    self.ttl = ttl
+    self.rng = rng or random.Random()
+    self.lock = threading.Lock()
+    self._loaded_at = None
+
+  def load(self, session=None):
+    rows = (session or db.session).query(Question.id, Question.category, Question.difficulty).all()
+
+    with self.lock:
+      self._ids = {}
+      self._positions = {}
+      for question_id, category, difficulty in rows:
+        self._add(question_id, category, difficulty)
+      self._loaded_at = time.time()
+
+  def stale(self):
+    # As with CategoryCache, an empty table is never treated as loaded.
+    return not self._loaded() or time.time() - self._loaded_at > self.ttl
+
+  def _ensure_loaded(self):
+    if self.stale():
+      self.load()
+
+  def _keys(self, category, difficulty):
+    categories = [ALL_CATEGORIES] if category is None else [ALL_CATEGORIES, int(category)]
+    for category in categories:
+      yield category
+      if difficulty is not None:
+        yield (category, int(difficulty))
+
+  def _add(self, question_id, category, difficulty):
+    for key in self._keys(category, difficulty):
+      ids = self._ids.setdefault(key, [])
+      positions = self._positions.setdefault(key, {})
+      if question_id not in positions:
+        positions[question_id] = len(ids)
+        ids.append(question_id)
+
+  def _remove(self, question_id):
+    # Swap with the last id and pop, so removal is O(1) per category.
+    for key, positions in self._positions.items():
+      position = positions.pop(question_id, None)
+      if position is None:
+        continue
+      ids = self._ids[key]
+      last = ids.pop()
+      if last != question_id:
+        ids[position] = last
+        positions[last] = position
+
+  def _loaded(self):
+    return self._loaded_at is not None and bool(self._ids)
+
+  def add(self, question_id, category, difficulty):
+    # Until a non-empty load has happened the next draw reloads anyway, so
+    # writes are left for that load to pick up.
+    with self.lock:
+      if self._loaded():
+        self._add(question_id, category, difficulty)
+
+  def remove(self, question_id):
+    with self.lock:
+      if self._loaded():
+        self._remove(question_id)
+
+  def count(self, category=ALL_CATEGORIES, difficulty=None):
+    self._ensure_loaded()
+    return len(self._ids.get(bucket(category, difficulty), []))
+
+  def ids(self, category=ALL_CATEGORIES, difficulty=None):
+    # A copy of the question ids in category, in no particular order.
+    self._ensure_loaded()
+    with self.lock:
+      return list(self._ids.get(bucket(category, difficulty), []))
+
+  def sample(self, category=ALL_CATEGORIES, exclude=(), difficulty=None):
+    # Returns a random question id in category (and difficulty, if given)
+    # that is not in exclude, or None when every question has been excluded.
+    self._ensure_loaded()
+    exclude = set(exclude)
+
+    with self.lock:
+      ids = self._ids.get(bucket(category, difficulty), [])
+      positions = self._positions.get(bucket(category, difficulty), {})
+      excluded = sum(1 for question_id in exclude if question_id in positions)
+      remaining = len(ids) - excluded
+      if remaining <= 0:
+        return None
+
+      if remaining * 2 >= len(ids):
+        while True:
+          question_id = ids[self.rng.randrange(len(ids))]
+          if question_id not in exclude:
+            return question_id
+
+      return self.rng.choice([question_id for question_id in ids if question_id not in exclude])
+
+  def sample_nearest(self, category=ALL_CATEGORIES, exclude=(), difficulty=None):
+    # Like sample(), but falls back to the closest difficulty (easier first
+    # on a tie) once the bucket for difficulty has run out.
+    if difficulty is None:
+      return self.sample(category, exclude)
+    for distance in range(len(DIFFICULTIES)):
+      for nearby in sorted({difficulty - distance, difficulty + distance}):
+        if nearby in DIFFICULTIES:
+          question_id = self.sample(category, exclude, nearby)
+          if question_id is not None:
+            return question_id
+    return None
+
+  def sample_question(self, category=ALL_CATEGORIES, exclude=(), difficulty=None):
+    # Like sample_nearest(), but returns the Question itself. Ids deleted by
+    # another process since the last load are dropped and the draw is retried.
+    exclude = set(exclude)
+    while True:
+      question_id = self.sample_nearest(category, exclude, difficulty)
+      if question_id is None:
+        return None
+      question = Question.query.get(question_id)
+      if question is not None:
+        return question
+      self.remove(question_id)
+      exclude.add(question_id)
+
+  def pick_quiz(self, category=ALL_CATEGORIES, difficulties=(), exclude=()):
+    # One question id per entry of difficulties, all distinct and none in
+    # exclude; cut short when the category runs out.
+    exclude = set(exclude)
+    question_ids = []
+    for difficulty in difficulties:
+      question_id = self.sample_nearest(category, exclude, difficulty)
+      if question_id is None:
+        break
+      question_ids.append(question_id)
+      exclude.add(question_id)
+    return question_ids
+
+  def sample_quiz(self, category=ALL_CATEGORIES, difficulties=(), exclude=()):
+    # The questions for pick_quiz(), loaded with a single query. Ids deleted
+    # by another process are dropped rather than redrawn, so this never takes
+    # a second round trip.
+    question_ids = self.pick_quiz(category, difficulties, exclude)
+    if not question_ids:
+      return []
+
+    questions = {question.id: question for question in Question.query.filter(Question.id.in_(question_ids))}
+    for question_id in question_ids:
+      if question_id not in questions:
+        self.remove(question_id)
+    return [questions[question_id] for question_id in question_ids if question_id in questions]
+
+
+def bucket(category, difficulty=None):
+  return int(category) if difficulty is None else (int(category), int(difficulty))
+
+
+def difficulty_curve(spec, length=QUESTIONS_PER_QUIZ):
+  '''
+  Expands a requested difficulty curve into one target difficulty per quiz
+  position. spec is either a list of difficulties or {'start': 1, 'end': 5},
+  which ramps linearly over length questions. Raises ValueError for anything
+  else.
+  '''
+  if isinstance(spec, dict):
+    start, end = int(spec['start']), int(spec['end'])
+    if length == 1:
+      curve = [start]
+    else:
+      curve = [round(start + (end - start) * position / (length - 1)) for position in range(length)]
+  elif isinstance(spec, list) and spec:
+    curve = [int(difficulty) for difficulty in spec]
+  else:
+    raise ValueError('difficulty_curve must be a list or an object with start and end')
+
+  if any(difficulty not in DIFFICULTIES for difficulty in curve):
+    raise ValueError('difficulties must be between 1 and 5')
+  return curve
@@ -0,0 +1,156 @@
+import re
+
+from sqlalchemy import inspect, text
+
+from models import db, Question
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+POSTGRES_SEARCH = text('''
+  SELECT id, question, answer, category, difficulty,
+    ts_rank(search_vector, query) AS rank,
+    ts_headline('english', coalesce(question, ''), query, :headline) AS question_highlight,
+    ts_headline('english', coalesce(answer, ''), query, :headline) AS answer_highlight
+  FROM questions, to_tsquery('english', :term) AS query
+  WHERE search_vector @@ query
+  ORDER BY rank DESC, id
+  LIMIT :limit OFFSET :offset
+''')
+
+POSTGRES_COUNT = text('''
+  SELECT count(*) FROM questions
+  WHERE search_vector @@ to_tsquery('english', :term)
+''')
+
+SQLITE_SETUP = [
+  '''CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+       question, answer, content='questions', content_rowid='id', tokenize='porter')''',
+  '''CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+       INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+     END''',
+  '''CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+       INSERT INTO questions_fts(questions_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+     END''',
+  '''CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions BEGIN
+       INSERT INTO questions_fts(questions_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+       INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+     END''',
+  "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')"
+]
+
+SQLITE_SEARCH = text('''
+  SELECT questions.id, questions.question, questions.answer, questions.category, questions.difficulty,
+    -bm25(questions_fts, 2.0, 1.0) AS rank,
+    highlight(questions_fts, 0, :start, :stop) AS question_highlight,
+    highlight(questions_fts, 1, :start, :stop) AS answer_highlight
+  FROM questions_fts JOIN questions ON questions.id = questions_fts.rowid
+  WHERE questions_fts MATCH :term
+  ORDER BY rank DESC, questions.id
+  LIMIT :limit OFFSET :offset
+''')
+
+SQLITE_COUNT = text('SELECT count(*) FROM questions_fts WHERE questions_fts MATCH :term')
+
+'''
+QuestionSearch
+    ranked full-text search over question and answer text, paginated in
+    the database. The backend is picked once by setup():
+      - 'postgres': the search_vector column and GIN index added by
+        trivia_search.psql, ranked with ts_rank and highlighted with
+        ts_headline
+      - 'sqlite': an FTS5 table kept current by triggers, created here
+        (for local testing)
+      - 'like': case-insensitive substring match on the question, used
+        when neither is available
+'''
+class QuestionSearch:
+
+  def __init__(self):
+    self.backend = None
+
+  def setup(self, connection=None):
+    # Uses a connection of its own from db.engine unless one is given (the
+    # async app passes the sync view of its connection).
+    if connection is None:
+      with db.engine.begin() as connection:
+        return self.setup(connection)
+
+    if connection.dialect.name == 'postgresql':
+      columns = [column['name'] for column in inspect(connection).get_columns('questions')]
+      self.backend = 'postgres' if 'search_vector' in columns else 'like'
+    elif connection.dialect.name == 'sqlite':
+      try:
+        for statement in SQLITE_SETUP:
+          connection.execute(text(statement))
+        self.backend = 'sqlite'
+      except Exception:
+        self.backend = 'like'
+    else:
+      self.backend = 'like'
+    return self.backend
+
+  def search(self, term, page=1, per_page=10, session=None):
+    # Returns (questions for the page, best match first, total matches,
+    # whether more pages follow). Each question carries question_highlight
+    # and answer_highlight with the matched words wrapped in <mark>.
+    session = session or db.session
+    offset = (page - 1) * per_page
+
+    if self.backend == 'like':
+      matches = session.query(Question).filter(Question.question.ilike('%{}%'.format(term)))
+      rows = matches.order_by(Question.id).limit(per_page + 1).offset(offset).all()
+      questions = [dict(question.format(),
+                        question_highlight=self._highlight(question.question, term),
+                        answer_highlight=question.answer) for question in rows]
+      return questions[:per_page], matches.count(), len(questions) > per_page
+
+    if self.backend == 'postgres':
+      search, count = POSTGRES_SEARCH, POSTGRES_COUNT
+      params = {'term': self._tsquery(term), 'headline': 'StartSel={}, StopSel={}, HighlightAll=true'.format(HIGHLIGHT_START, HIGHLIGHT_STOP)}
+    else:
+      search, count = SQLITE_SEARCH, SQLITE_COUNT
+      params = {'term': self._fts5_query(term), 'start': HIGHLIGHT_START, 'stop': HIGHLIGHT_STOP}
+    if not params['term']:
+      return [], 0, False
+
+    rows = session.execute(search, dict(params, limit=per_page + 1, offset=offset)).fetchall()
+    total = session.execute(count, params).scalar()
+
+    questions = [{
+      'id': row.id,
+      'question': row.question,
+      'answer': row.answer,
+      'category': row.category,
+      'difficulty': row.difficulty,
+      'question_highlight': row.question_highlight,
+      'answer_highlight': row.answer_highlight
+    } for row in rows[:per_page]]
+    return questions, total, len(rows) > per_page
+
+  @staticmethod
+  def _fts5_query(term):
+    # Quote every word so user input can't be read as FTS5 query syntax;
+    # the last word also matches as a prefix.
+    words = re.findall(r'\w+', term)
+    quoted = ['"{}"'.format(word) for word in words]
+    if quoted:
+      quoted[-1] += '*'
+    return ' '.join(quoted)
+
+  @staticmethod
+  def _tsquery(term):
+    # The same query for to_tsquery: every word required, the last one also
+    # as a prefix. Only word characters are kept, so nothing in the input is
+    # read as tsquery syntax.
+    words = re.findall(r'\w+', term.lower())
+    if words:
+      words[-1] += ':*'
+    return ' & '.join(words)
+
+  @staticmethod
+  def _highlight(value, term):
+    if not value:
+      return value
+    pattern = re.compile(re.escape(term), re.IGNORECASE)
+    return pattern.sub(lambda match: HIGHLIGHT_START + match.group(0) + HIGHLIGHT_STOP, value)
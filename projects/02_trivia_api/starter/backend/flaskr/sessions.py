@@ -0,0 +1,71 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+'''
+QuizSessionStore
+    server-side quiz sessions: each holds the ids of the questions still to
+    be asked, shuffled once when the session starts, so the client no
+    longer resends previous_questions on every step.
+
+    Sessions live in this process only. The store is bounded: sessions
+    untouched for ttl seconds are dropped, and once max_sessions is reached
+    the least recently used session is evicted to make room.
+'''
+class QuizSessionStore:
+
+  def __init__(self, max_sessions=10000, ttl=1800, rng=None):
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self.rng = rng or secrets.SystemRandom()
+    self.lock = threading.Lock()
+    self._sessions = OrderedDict()
+
+  def _evict(self, now):
+    # Sessions are kept in last-used order, so expired ones are at the front.
+    while self._sessions:
+      session_id, session = next(iter(self._sessions.items()))
+      if now - session['last_used'] <= self.ttl and len(self._sessions) < self.max_sessions:
+        break
+      del self._sessions[session_id]
+
+  def create(self, category, question_ids):
+    question_ids = list(question_ids)
+    self.rng.shuffle(question_ids)
+    session_id = secrets.token_urlsafe(16)
+    now = time.time()
+
+    with self.lock:
+      self._evict(now)
+      self._sessions[session_id] = {
+        'category': category,
+        'remaining': question_ids,
+        'asked': 0,
+        'last_used': now
+      }
+    return session_id
+
+  def pop(self, session_id):
+    # Returns (question id or None when the quiz is over, session), or
+    # (None, None) for an unknown or expired session.
+    now = time.time()
+    with self.lock:
+      session = self._sessions.get(session_id)
+      if session is None or now - session['last_used'] > self.ttl:
+        self._sessions.pop(session_id, None)
+        return None, None
+
+      session['last_used'] = now
+      self._sessions.move_to_end(session_id)
+      if not session['remaining']:
+        return None, session
+      session['asked'] += 1
+      return session['remaining'].pop(), session
+
+  def discard(self, session_id):
+    with self.lock:
+      self._sessions.pop(session_id, None)
+
+  def __len__(self):
+    return len(self._sessions)
@@ -0,0 +1,187 @@
+import threading
+
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import postgresql
+
+from models import db, Question, QuestionStat, PlayerScore
+
+
+def add_counts(session, model, key, counts):
+  # Adds {key: [answered, correct]} to the rows of model, inserting the
+  # missing ones: one INSERT ... ON CONFLICT on Postgres, otherwise an
+  # UPDATE for the existing keys and an INSERT for the rest.
+  table = model.__table__
+  column = table.c[key]
+  rows = [{key: value, 'answered': answered, 'correct': correct} for value, (answered, correct) in counts.items()]
+
+  if session.connection().dialect.name == 'postgresql':
+    statement = postgresql.insert(table).values(rows)
+    session.execute(statement.on_conflict_do_update(index_elements=[column], set_={
+      'answered': table.c.answered + statement.excluded.answered,
+      'correct': table.c.correct + statement.excluded.correct
+    }))
+    return
+
+  existing = {value for value, in session.query(column).filter(column.in_(list(counts)))}
+  updates = [{'key': row[key], 'add_answered': row['answered'], 'add_correct': row['correct']}
+             for row in rows if row[key] in existing]
+  inserts = [row for row in rows if row[key] not in existing]
+  if updates:
+    session.execute(table.update().where(column == bindparam('key')).values(
+      answered=table.c.answered + bindparam('add_answered'),
+      correct=table.c.correct + bindparam('add_correct')), updates)
+  if inserts:
+    session.execute(table.insert(), inserts)
+
+
+def merge_counts(target, counts):
+  for key, (answered, correct) in counts.items():
+    total = target.setdefault(key, [0, 0])
+    total[0] += answered
+    total[1] += correct
+
+'''
+AnswerStats
+    per-question and per-player answer counts, written behind: record()
+    only adds to counters in memory, and flush() writes everything recorded
+    since the last flush to question_stats and player_scores in one
+    transaction of batched upserts. start() flushes every interval seconds
+    on a background thread, or sooner once max_pending answers are waiting.
+
+    The leaderboard is served from memory as well. Only the top rows of
+    player_scores are loaded, through the index on correct, and since
+    scores only go up they are kept in a short sorted list that record()
+    updates in place. Players below the loaded rows have totals that aren't
+    known here, so their answers only reach the leaderboard once written and
+    reloaded; when player_scores has fewer than top rows every player is
+    known and counts at once. The background thread reloads the top rows
+    after every flush, so with several worker processes each one's
+    leaderboard includes the answers the others have written, at most
+    about two intervals late.
+'''
+class AnswerStats:
+
+  def __init__(self, top=10, max_pending=1000):
+    self.top = top
+    self.max_pending = max_pending
+    self.lock = threading.Lock()
+    self._full = threading.Event()
+    self._questions = {}
+    self._players = {}
+    self._flushing = ({}, {})
+    self._pending = 0
+    self._totals = {}
+    self._leaders = []
+    self._scores = None
+    self._complete = True
+    self.flushes = 0
+
+  def load(self, session=None):
+    scores = (session or db.session).query(PlayerScore.player, PlayerScore.answered, PlayerScore.correct) \
+      .order_by(PlayerScore.correct.desc(), PlayerScore.player).limit(self.top).all()
+    scores = [tuple(score) for score in scores]
+
+    with self.lock:
+      # The same rows as last time leave nothing to change: record() has
+      # already counted every answer since, and whatever this process wrote
+      # meanwhile was counted before it was written.
+      if scores == self._scores:
+        return
+      complete = len(scores) < self.top
+      totals = {player: [answered, correct] for player, answered, correct in scores}
+      # Answers recorded here but not written yet count as well, for the
+      # players whose written totals are known.
+      for counts in (self._flushing[1], self._players):
+        merge_counts(totals, {player: counts[player] for player in counts if complete or player in totals})
+      self._scores = scores
+      self._complete = complete
+      self._totals = totals
+      self._leaders = sorted(totals, key=self._rank)[:self.top]
+
+  def _rank(self, player):
+    return (-self._totals[player][1], player)
+
+  def record(self, question_id, correct, player=None):
+    correct = int(bool(correct))
+    with self.lock:
+      merge_counts(self._questions, {question_id: (1, correct)})
+      if player is not None:
+        merge_counts(self._players, {player: (1, correct)})
+      if player is not None and (self._complete or player in self._totals):
+        merge_counts(self._totals, {player: (1, correct)})
+        if player in self._leaders or len(self._leaders) < self.top or \
+            self._rank(player) < self._rank(self._leaders[-1]):
+          leaders = set(self._leaders)
+          leaders.add(player)
+          self._leaders = sorted(leaders, key=self._rank)[:self.top]
+      self._pending += 1
+      if self._pending >= self.max_pending:
+        self._full.set()
+
+  def forget(self, question_id):
+    # Drops the unwritten counts of a deleted question.
+    with self.lock:
+      self._questions.pop(question_id, None)
+
+  def pending(self):
+    return self._pending
+
+  def flush(self, session=None):
+    # Writes the counts recorded since the last flush and returns the number
+    # of answers written. If the write fails the counts are kept for the
+    # next flush and the error is raised.
+    session = session or db.session
+    with self.lock:
+      questions, players, pending = self._questions, self._players, self._pending
+      if not pending:
+        return 0
+      self._questions, self._players, self._pending = {}, {}, 0
+      self._flushing = (questions, players)
+
+    try:
+      if questions:
+        # Questions deleted since the answer was recorded are skipped.
+        ids = {question_id for question_id, in session.query(Question.id).filter(Question.id.in_(list(questions)))}
+        questions = {question_id: counts for question_id, counts in questions.items() if question_id in ids}
+      if questions:
+        add_counts(session, QuestionStat, 'question_id', questions)
+      if players:
+        add_counts(session, PlayerScore, 'player', players)
+      session.commit()
+    except Exception:
+      session.rollback()
+      with self.lock:
+        merge_counts(self._questions, questions)
+        merge_counts(self._players, players)
+        self._pending += pending
+      raise
+    finally:
+      with self.lock:
+        self._flushing = ({}, {})
+
+    self.flushes += 1
+    return pending
+
+  def start(self, app, interval):
+    def run():
+      while True:
+        self._full.wait(interval)
+        self._full.clear()
+        with app.app_context():
+          try:
+            self.flush()
+            self.load()
+          except Exception:
+            app.logger.exception('Could not write answer stats')
+          finally:
+            db.session.remove()
+
+    thread = threading.Thread(target=run, name='answer-stats', daemon=True)
+    thread.start()
+    return thread
+
+  def leaderboard(self, limit=None):
+    with self.lock:
+      leaders = self._leaders[:limit]
+      return [{'rank': rank, 'player': player, 'correct': self._totals[player][1], 'answered': self._totals[player][0]}
+              for rank, player in enumerate(leaders, 1)]
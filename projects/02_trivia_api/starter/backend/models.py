@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, ForeignKey, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -29,7 +29,8 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  # Existing String columns are converted with `flask upgrade-question-category`.
+  category = Column(Integer, ForeignKey('categories.id', onupdate='CASCADE', ondelete='SET NULL'), index=True)
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -75,4 +76,42 @@ class Category(db.Model):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+'''
+QuestionStat
+    how often a question has been answered in quizzes, and how often
+    correctly. Written in batches by AnswerStats (see flaskr/stats.py).
+'''
+class QuestionStat(db.Model):
+  __tablename__ = 'question_stats'
+
+  question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+  answered = Column(Integer, nullable=False, default=0)
+  correct = Column(Integer, nullable=False, default=0)
+
+  def format(self):
+    return {
+      'question_id': self.question_id,
+      'answered': self.answered,
+      'correct': self.correct
+    }
+
+'''
+PlayerScore
+    answers and correct answers per player name. Written in batches by
+    AnswerStats (see flaskr/stats.py), which reads the top players through
+    the index on correct.
+'''
+class PlayerScore(db.Model):
+  __tablename__ = 'player_scores'
+
+  player = Column(String(64), primary_key=True)
+  answered = Column(Integer, nullable=False, default=0)
+  correct = Column(Integer, nullable=False, default=0, index=True)
+
+  def format(self):
+    return {
+      'player': self.player,
+      'answered': self.answered,
+      'correct': self.correct
+    }
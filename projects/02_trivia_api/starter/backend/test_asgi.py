@@ -0,0 +1,90 @@
+import unittest
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('httpx')
+
+from starlette.testclient import TestClient
+
+from conftest import seed
+from flaskr.asgi import create_asgi_app
+from models import db
+
+
+@pytest.fixture(scope='module')
+def asgi_client(tmp_path_factory):
+    """The ASGI app on a seeded SQLite file of its own (aiosqlite can't share the in-memory one)."""
+    url = 'sqlite:///{}'.format(tmp_path_factory.mktemp('asgi') / 'trivia.db')
+    engine = create_engine(url)
+    db.Model.metadata.create_all(engine)
+    session = Session(bind=engine)
+    seed(session)
+    session.close()
+    engine.dispose()
+
+    with TestClient(create_asgi_app({'SQLALCHEMY_DATABASE_URI': url})) as client:
+        yield client
+
+
+class AsgiTestCase(unittest.TestCase):
+    """Smoke tests for flaskr/asgi.py; skipped without the packages in requirements-async.txt."""
+
+    @pytest.fixture(autouse=True)
+    def bind_client(self, asgi_client):
+        self.client = asgi_client
+
+    def test_get_categories(self):
+        res = self.client.get('/categories?counts=true')
+        data = res.json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['categories']), 6)
+        self.assertTrue(data['question_counts']['1'])
+
+    def test_get_paginated_questions(self):
+        res = self.client.get('/questions?page=1')
+        data = res.json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 10)
+        self.assertTrue(data['has_more'])
+
+    def test_404_sent_requesting_beyond_valid_page(self):
+        res = self.client.get('/questions?page=1000')
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(res.json()['message'], 'resource not found')
+
+    def test_search_questions(self):
+        res = self.client.post('/questions', json={'searchTerm': 'title'})
+        data = res.json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+
+    def test_quiz(self):
+        res = self.client.post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 3}, 'quiz_length': 3})
+        data = res.json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 3)
+        self.assertTrue(all(question['category'] == 3 for question in data['questions']))
+
+    def test_create_question_rejects_near_duplicates_and_delete(self):
+        question = {'question': "Whose autobiography is titled 'I Know Why the Caged Bird Sings'?",
+                    'answer': 'Maya Angelou', 'difficulty': 2, 'category': 4}
+        res = self.client.post('/questions', json=question)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual([duplicate['id'] for duplicate in res.json()['duplicates']], [5])
+
+        res = self.client.post('/questions', json=dict(question, allow_duplicate=True))
+        question_id = res.json()['question_id']
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.delete('/questions/{}'.format(question_id))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['deleted'], question_id)
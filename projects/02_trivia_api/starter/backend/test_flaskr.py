@@ -1,23 +1,30 @@
 import os
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+import gzip
+import pytest
+import threading
+from sqlalchemy import event
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from models import db, Question, Category, QuestionStat, PlayerScore
+from flaskr.caches import SearchResultCache
+from flaskr.duplicates import DuplicateIndex
+from flaskr.metrics import Metrics
+from flaskr.search import QuestionSearch
+from flaskr.stats import AnswerStats
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
-    def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+    @pytest.fixture(autouse=True)
+    def bind_app(self, app, db_session):
+        """Use the worker's app; every test runs in a rolled-back transaction (see conftest.py)."""
+        self.app = app
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
 
+    def setUp(self):
+        """Define test variables."""
         self.new_question = {
             'question': 'What year did Apollo 11 land on the moon?',
             'answer': '1969',
@@ -25,13 +32,6 @@ class TriviaTestCase(unittest.TestCase):
             'category': 4
         }
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
     def tearDown(self):
         """Executed after reach test"""
         pass
@@ -48,6 +48,118 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(len(data['categories']))
 
+    def test_get_categories_with_question_counts(self):
+        res = self.client().get('/categories?counts=true')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(set(data['question_counts']), set(data['categories']))
+        self.assertEqual(data['question_counts']['1'], Question.query.filter(Question.category == 1).count())
+
+    def test_category_count_updated_after_create(self):
+        before = json.loads(self.client().get('/categories?counts=true').data)['question_counts']['4']
+        self.client().post('/questions', json=self.new_question)
+        after = json.loads(self.client().get('/categories?counts=true').data)['question_counts']['4']
+
+        self.assertEqual(after, before + 1)
+
+    def test_429_when_client_exceeds_rate_limit(self):
+        limiter = self.app.extensions['rate_limiter']
+        rate, burst = limiter.rate, limiter.burst
+        limiter.rate, limiter.burst = 0.01, 2
+        try:
+            statuses = [self.client().get('/categories', headers={'X-API-Key': 'rate-limit-test'}).status_code
+                        for _ in range(3)]
+            res = self.client().get('/categories', headers={'X-API-Key': 'rate-limit-test'})
+        finally:
+            limiter.rate, limiter.burst = rate, burst
+        data = json.loads(res.data)
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(data['message'], 'too many requests')
+        self.assertTrue(int(res.headers['Retry-After']) >= 1)
+
+    def test_unknown_api_keys_share_the_address_bucket(self):
+        limiter = self.app.extensions['rate_limiter']
+        rate, burst = limiter.rate, limiter.burst
+        limiter.rate, limiter.burst = 0.01, 2
+        try:
+            statuses = [self.client().get('/categories', headers={'X-API-Key': 'made-up-{}'.format(attempt)},
+                                          environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code
+                        for attempt in range(3)]
+        finally:
+            limiter.rate, limiter.burst = rate, burst
+
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_503_when_too_many_requests_in_flight(self):
+        limiter = self.app.extensions['concurrency_limiter']
+        max_in_flight = limiter.max_in_flight
+        limiter.max_in_flight = 0
+        try:
+            res = self.client().get('/categories')
+        finally:
+            limiter.max_in_flight = max_in_flight
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(res.headers['Retry-After'], '1')
+
+        res = self.client().get('/admission')
+        self.assertEqual(json.loads(res.data)['concurrency']['in_flight'], 0)
+
+    def test_metrics(self):
+        self.client().get('/questions')
+        self.client().get('/categories/1000/questions')
+        res = self.client().get('/metrics')
+        body = res.data.decode()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith('text/plain'))
+        self.assertIn('# TYPE trivia_request_duration_seconds histogram', body)
+        self.assertIn('trivia_request_duration_seconds_bucket{route="/questions",method="GET",le="+Inf"}', body)
+        self.assertIn('trivia_request_db_seconds_count{route="/questions",method="GET"}', body)
+        self.assertIn('trivia_requests_total{route="/categories/<int:category_id>/questions",method="GET",status="404"}', body)
+        # The scrape itself is in flight.
+        self.assertIn('trivia_requests_in_flight 1', body)
+
+    def test_metrics_of_finished_threads_are_kept_without_their_shards(self):
+        metrics = Metrics()
+
+        def serve():
+            metrics.finish_request('/questions', 'GET', 200, metrics.start_request())
+            metrics.end_request()
+
+        for _ in range(50):
+            thread = threading.Thread(target=serve)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(metrics._shards), 0)
+        self.assertIn('trivia_requests_total{route="/questions",method="GET",status="200"} 50', metrics.render())
+
+    def test_bootstrap(self):
+        res = self.client().get('/bootstrap', headers={'Accept-Encoding': 'gzip'})
+        data = json.loads(gzip.decompress(res.data))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(data['success'], True)
+        self.assertEqual(len(data['categories']), 6)
+        self.assertEqual(sum(data['question_counts'].values()), data['total_questions'])
+        self.assertEqual(len(data['questions']), 10)
+        self.assertEqual(data['has_more'], True)
+
+        res = self.client().get('/bootstrap', headers={'Accept-Encoding': 'gzip', 'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+        self.client().delete('/questions/{}'.format(data['questions'][0]['id']))
+        res = self.client().get('/bootstrap')
+        self.assertEqual(json.loads(res.data)['total_questions'], data['total_questions'] - 1)
+
     def test_get_paginated_questions(self):
         res = self.client().get('/questions')
         data = json.loads(res.data)
@@ -59,6 +171,21 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(data['categories']))
         self.assertTrue(len(data['current_category']))
 
+    def test_get_questions_by_cursor(self):
+        res = self.client().get('/questions')
+        first_page = json.loads(res.data)
+
+        self.assertTrue(first_page['has_more'])
+        self.assertEqual(first_page['next_cursor'], first_page['questions'][-1]['id'])
+
+        res = self.client().get('/questions?cursor={}'.format(first_page['next_cursor']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['questions']))
+        self.assertTrue(all(question['id'] > first_page['next_cursor'] for question in data['questions']))
+
     def test_404_sent_requesting_beyond_valid_page(self):
         res = self.client().get('/questions?page=1000')
         data = json.loads(res.data)
@@ -76,6 +203,7 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(len(data['questions']))
         self.assertTrue(len(data['current_category']))
+        self.assertTrue(all(question['category'] == 1 for question in data['questions']))
 
     def test_search_questions(self):
         res = self.client().post('/questions', json={'searchTerm': 'title'})
@@ -84,8 +212,68 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertTrue(data['current_category'])
-        self.assertEqual(len(data['questions']), 2)
-        self.assertEqual(data['total_questions'], 2)
+        # Full-text search matches whole words, so 'entitled' no longer matches 'title'.
+        self.assertEqual(len(data['questions']), 1)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertIn('<mark>title</mark>', data['questions'][0]['question_highlight'])
+
+    def test_search_questions_matches_answers(self):
+        res = self.client().post('/questions', json={'searchTerm': 'scissorhands'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(data['questions'][0]['answer'], 'Edward Scissorhands')
+        self.assertIn('<mark>Scissorhands</mark>', data['questions'][0]['answer_highlight'])
+
+    def test_search_matches_the_last_word_as_a_prefix(self):
+        res = self.client().post('/questions', json={'searchTerm': 'Edward Scissorh'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([question['answer'] for question in data['questions']], ['Edward Scissorhands'])
+
+        # Only the last word: an earlier one has to match a whole word.
+        res = self.client().post('/questions', json={'searchTerm': 'Scissorh Edward'})
+        self.assertEqual(json.loads(res.data)['total_questions'], 0)
+
+        # Postgres builds the same query for to_tsquery.
+        self.assertEqual(QuestionSearch._tsquery('Edward Scissorh'), 'edward & scissorh:*')
+        self.assertEqual(QuestionSearch._tsquery('Edward & !Scissorh'), 'edward & scissorh:*')
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.client().post('/questions', json={'searchTerm': 'title'})
+
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            res = self.client().post('/questions', json={'searchTerm': '  Title '})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+        self.assertEqual(statements, [])
+
+        self.client().post('/questions', json=dict(self.new_question, question='Which book has the title Dune?'))
+        res = self.client().post('/questions', json={'searchTerm': 'title'})
+        self.assertEqual(json.loads(res.data)['total_questions'], 2)
+
+    def test_search_result_is_not_cached_across_a_write(self):
+        cache = SearchResultCache()
+        generation = cache.generation
+        cache.invalidate()  # a question was added while the search ran
+        cache.put('title', 1, ([], 0, False), generation)
+
+        self.assertIsNone(cache.get('title', 1))
+
+        cache.put('title', 1, ([], 0, False), cache.generation)
+        self.assertEqual(cache.get('title', 1), ([], 0, False))
 
     def test_search_questions_no_results(self):
         res = self.client().post('/questions', json={'searchTerm': 'jghfuyfgityu67'})
@@ -123,6 +311,103 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['question_id'])
 
+    def test_409_for_near_duplicate_question(self):
+        reworded = dict(self.new_question, question="Whose autobiography is titled 'I Know Why the Caged Bird Sings'?")
+        res = self.client().post('/questions', json=reworded)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(data['success'], False)
+        self.assertEqual([duplicate['id'] for duplicate in data['duplicates']], [5])
+
+        res = self.client().post('/questions', json=dict(reworded, allow_duplicate=True))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['question_id'])
+        self.assertEqual(data['duplicates'][0]['id'], 5)
+
+    def test_duplicate_index_reloads_in_the_background_past_ttl(self):
+        index = DuplicateIndex()
+        index.load()
+        index._loaded_at -= index.ttl + 1
+        reloaded = threading.Event()
+        index.load = lambda session=None: reloaded.set()
+
+        with self.app.app_context():
+            duplicates = index.find("Whose autobiography is titled 'I Know Why the Caged Bird Sings'?")
+
+        self.assertEqual([question_id for question_id, similarity in duplicates], [5])
+        self.assertTrue(reloaded.wait(5))
+
+    def test_duplicate_index_keeps_writes_made_during_a_load(self):
+        index = DuplicateIndex()
+
+        class DeletesWhileReading:
+            def query(self, *columns):
+                index.remove(5)
+                return db.session.query(*columns)
+
+        index.load(DeletesWhileReading())
+
+        self.assertEqual(index.find("Whose autobiography is titled 'I Know Why the Caged Bird Sings'?"), [])
+
+    def test_create_questions_batch(self):
+        res = self.client().post('/questions/batch', json={'questions': [
+            self.new_question,
+            dict(self.new_question, category=1000),
+            self.new_question
+        ]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(data['failed'], 1)
+        self.assertEqual([result['status'] for result in data['results']], ['created', 'invalid', 'created'])
+        self.assertTrue(Question.query.get(data['results'][0]['id']))
+
+    def test_400_for_empty_questions_batch(self):
+        res = self.client().post('/questions/batch', json={'questions': []})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_delete_questions_batch(self):
+        res = self.client().delete('/questions?ids=5,9,1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['deleted'], [5, 9])
+        self.assertEqual(data['results'][2], {'id': 1000, 'status': 'not_found'})
+        self.assertEqual(Question.query.filter(Question.id.in_([5, 9])).count(), 0)
+
+    def test_export_questions(self):
+        res = self.client().get('/questions/export')
+        lines = res.data.decode().splitlines()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(lines), Question.query.count())
+        self.assertTrue(json.loads(lines[0])['question'])
+
+    def test_import_questions_reports_invalid_rows(self):
+        body = '\n'.join([
+            json.dumps(self.new_question),
+            json.dumps(dict(self.new_question, difficulty=9)),
+            '{not json'
+        ])
+        res = self.client().post('/questions/import', data=body, content_type='application/x-ndjson')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['failed'], 2)
+        self.assertEqual([error['line'] for error in data['errors']], [2, 3])
+
     def test_quiz(self):
         res = self.client().post('/quizzes', json={'previous_questions': [6,10], 'quiz_category': {'id': '3', 'type': 'Geography'}})
         data = json.loads(res.data)
@@ -131,6 +416,226 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['question'])
 
+    def test_quiz_never_repeats_a_question(self):
+        previous_questions = []
+        while True:
+            res = self.client().post('/quizzes', json={'previous_questions': previous_questions, 'quiz_category': {'id': 2, 'type': 'Art'}})
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            if not data['question']:
+                break
+            self.assertNotIn(data['question']['id'], previous_questions)
+            self.assertEqual(int(data['question']['category']), 2)
+            previous_questions.append(data['question']['id'])
+
+        self.assertEqual(len(previous_questions), Question.query.filter(Question.category == 2).count())
+
+    def test_quiz_follows_difficulty_curve_in_one_query(self):
+        statements = []
+        def record(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            res = self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 0},
+                                                       'quiz_length': 5, 'difficulty_curve': [1, 1, 1, 2, 2]})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(statements), 1)
+        # Only two questions have difficulty 1, so the third falls back to 2.
+        self.assertEqual([question['difficulty'] for question in data['questions']], [1, 1, 2, 2, 2])
+        self.assertEqual(len({question['id'] for question in data['questions']}), 5)
+
+    def test_400_quiz_with_invalid_difficulty_curve(self):
+        res = self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 0},
+                                                   'difficulty_curve': {'start': 1, 'end': 9}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_check_quiz_answer(self):
+        for guess, correct in [('maya angelou', True), ('Angelou, Maya!', True), ('Maya Angleou', True),
+                               ('It was Maya Angelou', True), ('Muhammad Ali', False), ('', False),
+                               ('Muhammad Ali Maya Angelou Toni Morrison', False)]:
+            res = self.client().post('/quizzes/answer', json={'question_id': 5, 'answer': guess})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['correct'], correct, guess)
+            self.assertEqual(data['answer'], 'Maya Angelou')
+
+    def test_check_quiz_answer_rejects_candidate_lists_and_negations(self):
+        for question_id, guess in [(10, 'argentina brazil uruguay'), (10, 'brazil uruguay'), (10, 'not brazil'),
+                                   (10, 'never Brazil'), (12, 'george washington carver lincoln'),
+                                   (5, 'maya angelou or muhammad ali')]:
+            res = self.client().post('/quizzes/answer', json={'question_id': question_id, 'answer': guess})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['correct'], False, guess)
+
+        res = self.client().post('/quizzes/answer', json={'question_id': 10, 'answer': 'I think it is Brazil'})
+        self.assertEqual(json.loads(res.data)['correct'], False)
+        res = self.client().post('/quizzes/answer', json={'question_id': 10, 'answer': 'it is Brazil'})
+        self.assertEqual(json.loads(res.data)['correct'], True)
+
+    def test_400_check_answer_too_long(self):
+        res = self.client().post('/quizzes/answer', json={'question_id': 5, 'answer': 'Maya Angelou ' * 100})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_404_check_answer_for_unknown_question(self):
+        res = self.client().post('/quizzes/answer', json={'question_id': 1000, 'answer': 'Maya Angelou'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_answer_stats_and_leaderboard(self):
+        stats = self.app.extensions['answer_stats']
+        stats.flush()
+        for guess, player in [('Maya Angelou', 'ada'), ('Muhammad Ali', 'ada'), ('Maya Angelou', 'bo'), ('Maya Angelou', None)]:
+            self.client().post('/quizzes/answer', json={'question_id': 5, 'answer': guess, 'player': player})
+
+        res = self.client().get('/leaderboard')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['leaders'][:2], [{'rank': 1, 'player': 'ada', 'correct': 1, 'answered': 2},
+                                               {'rank': 2, 'player': 'bo', 'correct': 1, 'answered': 1}])
+        self.assertEqual(stats.pending(), 4)
+
+        self.assertEqual(stats.flush(), 4)
+        self.assertEqual(stats.pending(), 0)
+        self.assertEqual(QuestionStat.query.get(5).format(), {'question_id': 5, 'answered': 4, 'correct': 3})
+        self.assertEqual(PlayerScore.query.get('ada').format(), {'player': 'ada', 'answered': 2, 'correct': 1})
+
+        # A second flush adds to the rows already written.
+        self.client().post('/quizzes/answer', json={'question_id': 5, 'answer': 'Maya Angelou', 'player': 'ada'})
+        stats.flush()
+        self.assertEqual(PlayerScore.query.get('ada').format(), {'player': 'ada', 'answered': 3, 'correct': 2})
+
+    def test_leaderboard_includes_scores_written_by_other_workers(self):
+        stats = self.app.extensions['answer_stats']
+        score = PlayerScore(player='other-worker', answered=60, correct=50)
+        db.session.add(score)
+        db.session.commit()
+        try:
+            stats.load()
+            leaders = json.loads(self.client().get('/leaderboard').data)['leaders']
+        finally:
+            db.session.delete(score)
+            db.session.commit()
+            stats.load()
+
+        self.assertEqual(leaders[0], {'rank': 1, 'player': 'other-worker', 'correct': 50, 'answered': 60})
+
+    def test_leaderboard_loads_only_the_top_players(self):
+        stats = AnswerStats(top=2)
+        db.session.add_all([PlayerScore(player=player, answered=60, correct=correct)
+                            for player, correct in [('first', 50), ('second', 40), ('third', 30)]])
+        db.session.commit()
+        stats.load()
+
+        # third's written total isn't loaded, so an answer doesn't put them on
+        # the board with a partial count; second's counts at once.
+        stats.record(5, True, 'third')
+        stats.record(5, True, 'second')
+        self.assertEqual([(leader['player'], leader['correct']) for leader in stats.leaderboard()],
+                         [('first', 50), ('second', 41)])
+
+        db.session.query(PlayerScore).filter_by(player='third').update({'correct': 60})
+        db.session.commit()
+        stats.load()
+        self.assertEqual([(leader['player'], leader['correct']) for leader in stats.leaderboard()],
+                         [('third', 61), ('first', 50)])
+
+    def test_400_leaderboard_with_bad_limit(self):
+        res = self.client().get('/leaderboard?limit=0')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_quiz_session(self):
+        res = self.client().post('/quizzes/sessions', json={'quiz_category': {'id': 3, 'type': 'Geography'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['session_id'])
+
+        asked = []
+        for _ in range(data['total_questions']):
+            res = self.client().get('/quizzes/sessions/{}/next'.format(data['session_id']))
+            question = json.loads(res.data)['question']
+            self.assertEqual(int(question['category']), 3)
+            asked.append(question['id'])
+
+        res = self.client().get('/quizzes/sessions/{}/next'.format(data['session_id']))
+        self.assertEqual(json.loads(res.data)['question'], None)
+        self.assertEqual(len(set(asked)), data['total_questions'])
+
+    def test_quiz_deck(self):
+        res = self.client().post('/quizzes/deck', json={'quiz_category': {'id': 4, 'type': 'History'}, 'size': 3})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['total_questions'], 3)
+        self.assertEqual(len({question['id'] for question in data['questions']}), 3)
+        self.assertTrue(all(question['category'] == 4 for question in data['questions']))
+        self.assertEqual(res.headers['ETag'], '"{}"'.format(data['deck_id']))
+
+        res = self.client().get('/quizzes/deck/{}'.format(data['deck_id']))
+        self.assertEqual(json.loads(res.data)['questions'], data['questions'])
+
+        res = self.client().get('/quizzes/deck/{}'.format(data['deck_id']), headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    def test_404_unknown_quiz_deck(self):
+        res = self.client().get('/quizzes/deck/not-a-deck')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_404_next_question_for_unknown_quiz_session(self):
+        res = self.client().get('/quizzes/sessions/not-a-session/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_400_quiz_with_non_numeric_category(self):
+        res = self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 'x'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_quiz_without_category_uses_all_categories(self):
+        res = self.client().post('/quizzes', json={'previous_questions': []})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['question'])
+
+    def test_404_quiz_for_unknown_category(self):
+        res = self.client().post('/quizzes', json={'previous_questions': [], 'quiz_category': {'id': 1000, 'type': 'Unknown'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
@@ -18,7 +18,27 @@ class QuestionView extends Component {
   }
 
   componentDidMount() {
-    this.getQuestions();
+    this.getBootstrap();
+  }
+
+  // The first page, categories and totals in one (cached, gzipped) response.
+  getBootstrap = () => {
+    $.ajax({
+      url: `/bootstrap`, //TODO: update request URL
+      type: "GET",
+      success: (result) => {
+        this.setState({
+          questions: result.questions,
+          totalQuestions: result.total_questions,
+          categories: result.categories,
+          currentCategory: result.current_category })
+        return;
+      },
+      error: (error) => {
+        alert('Unable to load questions. Please try your request again')
+        return;
+      }
+    })
   }
 
   getQuestions = () => {